@@ -8,21 +8,146 @@ package information, using repodata to extract accurate package metadata.
 from __future__ import annotations
 
 import argparse
+import copy
+import functools
+import hashlib
+import json
 import logging
+import os
 import re
+import stat
 import sys
-from contextlib import suppress
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext, suppress
 from pathlib import Path
-from typing import TYPE_CHECKING, Any
-from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
-
-import yaml
-from rattler import CondaLockedPackage, LockFile, PypiLockedPackage
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple, cast
+from urllib.parse import (
+    parse_qs,
+    parse_qsl,
+    unquote,
+    urlencode,
+    urlsplit,
+    urlunsplit,
+)
 
+# Heavy dependencies (rattler, yaml, rich, ...) are imported where they are used,
+# so that e.g. `--help` and runs without anything to convert start fast.
 if TYPE_CHECKING:
-    from rattler import Platform, RepoDataRecord
+    from collections.abc import Callable, Iterable, Iterator
+    from http.server import ThreadingHTTPServer
+
+    from rattler import (
+        CondaLockedPackage,
+        Environment,
+        LockedPackage,
+        LockFile,
+        LockPlatform,
+        Platform,
+        PypiLockedPackage,
+        RepoDataRecord,
+    )
+
+__all__ = [
+    "Profiler",
+    "convert",
+    "convert_to_dict",
+    "iter_conda_lock_packages",
+    "main",
+]
+
+
+class _PlatformResult(NamedTuple):
+    """The converted package entries of one platform of an environment."""
+
+    entries: list[_PackageEntry]
+    # Profiler records of a worker process (see `_convert_platform_in_worker`)
+    profile: list[dict[str, Any]] | None = None
+
+
+class Profiler:
+    """Record the wall time, package count and peak memory of conversion stages.
+
+    Pass an instance to `convert` (or use ``--profile`` on the command line) and
+    read ``records`` afterwards, or write them with `Profiler.write_json`. Every
+    record is a dict with the ``stage`` (``"parse"``, ``"repodata"``, ``"entries"``
+    or ``"write"``), ``environment`` and ``platform`` (None when not applicable),
+    ``seconds``, ``packages`` and ``peak_memory_bytes`` (the peak of the memory
+    traced by `tracemalloc` during the stage, relative to its start).
+    """
+
+    def __init__(self, *, trace_memory: bool = True) -> None:
+        """Create a profiler.
+
+        Args:
+            trace_memory: Whether to trace memory allocations, which slows down the
+                conversion (default: True)
+
+        """
+        self.trace_memory = trace_memory
+        self.records: list[dict[str, Any]] = []
+
+    @contextmanager
+    def stage(
+        self,
+        stage: str,
+        environment: str | None = None,
+        platform: str | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Time a stage, the caller may set ``"packages"`` on the yielded record."""
+        record: dict[str, Any] = {
+            "stage": stage,
+            "environment": environment,
+            "platform": platform,
+            "seconds": None,
+            "packages": None,
+            "peak_memory_bytes": None,
+        }
+        import tracemalloc
+
+        start_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                record["peak_memory_bytes"] = peak_memory - start_memory
+            if start_tracing:
+                tracemalloc.stop()
+            self.records.append(record)
+
+    def write_json(self, path: str | Path) -> None:
+        """Write the records to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "version": _converter_version(),
+                    "total_seconds": sum(r["seconds"] for r in self.records),
+                    "stages": self.records,
+                },
+                f,
+                indent=2,
+            )
 
-__all__ = ["convert", "main"]
+
+def _profile_stage(
+    profiler: Profiler | None,
+    stage: str,
+    environment: str | None = None,
+    platform: str | None = None,
+) -> Any:
+    """`Profiler.stage` or a no-op context manager if not profiling."""
+    if profiler is None:
+        return nullcontext({})
+    return profiler.stage(stage, environment, platform)
 
 
 def _format_pypi_package_url(location: Any) -> str:
@@ -59,6 +184,14 @@ def convert(
     lock_file_path: str | Path = "pixi.lock",
     environment: str = "default",
     conda_lock_path: str | Path = "conda_lock",
+    *,
+    platforms: Iterable[str | Platform] | None = None,
+    artifact_cache: str | Path | None = None,
+    split_platforms: bool = False,
+    mirrors: Mapping[str, str] | None = None,
+    only: Iterable[str] | None = None,
+    use_cache: bool = True,
+    profiler: Profiler | None = None,
 ) -> None:
     """Convert a pixi.lock file to a conda-lock.yml file.
 
@@ -66,11 +199,447 @@ def convert(
         lock_file_path: Path to the pixi.lock file
         environment: Specific environment to convert (default: 'default')
         conda_lock_path: Output path for the conda-lock.yml file (default: current directory)
+        platforms: Only convert these platforms of the environment (default: all)
+        artifact_cache: Directory with package archives (a conda pkgs directory or
+            a wheelhouse) used to fill in and verify hashes (see `--artifact-cache`)
+        split_platforms: Write a file per platform instead, named after
+            ``conda_lock_path`` (e.g., ``conda-lock.linux-64.yml``)
+        mirrors: Mapping of URL prefixes to the mirrors that replace them in the
+            package URLs and channels (see ``--mirror``)
+        only: Only write these packages and the packages they (transitively)
+            depend on (see ``--only``, default: all packages)
+        use_cache: Skip the conversion if the environment did not change since the
+            last conversion to ``conda_lock_path`` (default: True)
+        profiler: Records the timings and memory usage of the conversion stages
+
+    """
+    conda_lock_path = Path(conda_lock_path)
+    selection = _platform_selection(platforms)
+    artifacts = _ArtifactHashes(Path(artifact_cache)) if artifact_cache else None
+    mirror_map = _mirror_map(mirrors)
+    only = _package_selection(only)
+    options = _cache_options(
+        selection,
+        artifacts,
+        split=split_platforms,
+        mirrors=mirror_map,
+        only=only,
+    )
+    cache = _ConversionCache(conda_lock_path.parent) if use_cache else None
+    if cache is not None:
+        lock_digest = _file_digest(lock_file_path)
+        # The files per platform are only known after parsing the lock file
+        if not split_platforms and cache.is_fresh(
+            conda_lock_path,
+            environment=environment,
+            lock_digest=lock_digest,
+            **options,
+        ):
+            logging.info("Environment '%s' is unchanged, skipping", environment)
+            return
+    lock_file = _parse_lock_file(lock_file_path, profiler)
+    env = _get_environment(lock_file, environment, only)
+    # Raises if the environment lacks any of the platforms
+    env_platforms = _select_platforms(env, selection)
+    output_files = [
+        file_path
+        for file_path, _ in _output_files(
+            conda_lock_path,
+            env_platforms,
+            split=split_platforms,
+        )
+    ]
+    if cache is not None:
+        fingerprint = _environment_fingerprint(env, selection)
+        if cache.all_fresh(
+            output_files,
+            environment=environment,
+            fingerprint=fingerprint,
+            **options,
+        ):
+            logging.info("Environment '%s' is unchanged, skipping", environment)
+            cache.update_all(
+                output_files,
+                environment=environment,
+                fingerprint=fingerprint,
+                lock_digest=lock_digest,
+                **options,
+            )
+            cache.save()
+            return
+    logging.info("Converting pixi lock file to conda-lock format for %s", environment)
+    _write_environment(
+        conda_lock_path,
+        env,
+        environment,
+        env_platforms,
+        _iter_platform_entries(
+            env,
+            env_platforms,
+            environment,
+            profiler,
+            _planned_index([env], selection, mirror_map),
+        ),
+        profiler,
+        artifacts,
+        split=split_platforms,
+        mirrors=mirror_map,
+    )
+    if artifacts is not None:
+        # Before updating the cache, so that the next run fails too
+        artifacts.check()
+    if cache is not None:
+        cache.update_all(
+            output_files,
+            environment=environment,
+            fingerprint=fingerprint,
+            lock_digest=lock_digest,
+            **options,
+        )
+        cache.save()
+
+
+def convert_to_dict(
+    lock_file: LockFile | bytes | str | Path,
+    environment: str = "default",
+    *,
+    platforms: Iterable[str | Platform] | None = None,
+    mirrors: Mapping[str, str] | None = None,
+    only: Iterable[str] | None = None,
+) -> dict[str, Any]:
+    """Convert an environment of a pixi.lock file to conda-lock data in memory.
+
+    Args:
+        lock_file: A parsed `rattler.LockFile`, the contents of a pixi.lock file
+            (bytes) or the path to one
+        environment: The environment to convert (default: 'default')
+        platforms: Only convert these platforms of the environment (default: all)
+        mirrors: Mapping of URL prefixes to the mirrors that replace them
+        only: Only convert these packages and the packages they depend on
+
+    Returns:
+        The conda-lock data, as it would be written by `convert`. The
+        `dependencies` mappings of the package entries are shared between
+        entries, so they must not be modified.
+
+    """
+    lock_file = _load_lock_file(lock_file)
+    _select_platforms(_get_environment(lock_file, environment), platforms)
+    conda_lock_data = _convert_env_to_conda_lock(
+        lock_file,
+        environment,
+        index=_PackageIndex(_mirror_map(mirrors)),
+        platforms=platforms,
+        only=only,
+    )
+    conda_lock_data["package"] = [
+        entry.to_dict() for entry in conda_lock_data["package"]
+    ]
+    return conda_lock_data
+
+
+def iter_conda_lock_packages(
+    lock_file: LockFile | bytes | str | Path,
+    environment: str = "default",
+    *,
+    platforms: Iterable[str | Platform] | None = None,
+    mirrors: Mapping[str, str] | None = None,
+    only: Iterable[str] | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Lazily yield the conda-lock package entries of an environment.
+
+    The entries are yielded platform by platform, in the order of `convert`,
+    and are only created when they are requested.
+
+    Args:
+        lock_file: A parsed `rattler.LockFile`, the contents of a pixi.lock file
+            (bytes) or the path to one
+        environment: The environment to convert (default: 'default')
+        platforms: Only yield the entries of these platforms (default: all)
+        mirrors: Mapping of URL prefixes to the mirrors that replace them
+        only: Only yield these packages and the packages they depend on
+
+    """
+    env = _get_environment(_load_lock_file(lock_file), environment, only)
+    # Only keeps the entries that are yielded again (e.g., for another platform)
+    index = _planned_index([env], platforms, _mirror_map(mirrors))
+    for platform in _select_platforms(env, platforms):
+        packages = env.packages(platform) or []
+        index.add_repodata_records(env, platform, packages)
+        _validate_pip_in_platform_packages(platform, packages)
+        for entry in index.iter_entries(platform, packages):
+            yield entry.to_dict()
+
+
+def _load_lock_file(lock_file: LockFile | bytes | str | Path) -> LockFile:
+    """A parsed lock file, from a `LockFile`, the contents of a file or a path."""
+    if isinstance(lock_file, (str, Path)):
+        return _parse_lock_file(lock_file, None)
+    if not isinstance(lock_file, bytes):
+        return lock_file
+    # rattler only parses lock files from a path
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "pixi.lock"
+        path.write_bytes(lock_file)
+        return _parse_lock_file(path, None)
+
+
+def _select_platforms(
+    env: Environment,
+    platforms: Iterable[str | Platform] | None,
+    *,
+    strict: bool = True,
+) -> list[LockPlatform]:
+    """The (sorted) platforms of an environment, optionally only the given ones.
+
+    Args:
+        env: The environment
+        platforms: The platforms to select (default: all)
+        strict: Raise a ValueError if the environment lacks any of the platforms,
+            instead of selecting only those that it has
+
+    """
+    env_platforms = _sorted_platforms(env)
+    if platforms is None:
+        return env_platforms
+    names = {str(platform) for platform in platforms}
+    missing = names - {str(platform) for platform in env_platforms}
+    if missing and strict:
+        msg = (
+            f"Platform(s) {', '.join(sorted(missing))} not found, available:"
+            f" {', '.join(str(platform) for platform in env_platforms)}"
+        )
+        raise ValueError(msg)
+    return [platform for platform in env_platforms if str(platform) in names]
+
+
+def _platform_selection(
+    platforms: Iterable[str | Platform] | None,
+) -> list[str] | None:
+    """The sorted names of selected platforms, None for all (as stored in the cache)."""
+    return None if platforms is None else sorted({str(p) for p in platforms})
+
+
+def _parse_lock_file(lock_file_path: str | Path, profiler: Profiler | None) -> LockFile:
+    """Parse a pixi.lock file."""
+    from rattler import LockFile
+
+    with _profile_stage(profiler, "parse"):
+        return LockFile.from_path(lock_file_path)
+
+
+def _write_conda_lock_file(
+    file_path: Path,
+    env: Environment,
+    env_name: str,
+    platforms: list[LockPlatform],
+    platform_entries: Iterable[list[_PackageEntry]],
+    profiler: Profiler | None = None,
+    artifacts: _ArtifactHashes | None = None,
+    explicit: bool = False,  # noqa: FBT001, FBT002
+    *,
+    mirrors: _MirrorMap | None = None,
+    dry_run: bool = False,
+) -> bool:
+    """Write the conda-lock file of an environment, one platform at a time.
+
+    ``platform_entries`` yields the package entries of each of the ``platforms``,
+    in order, e.g., lazily with `_iter_platform_entries`. Every platform is written
+    before the entries of the next one are requested, so only those of a single
+    platform are held at once. The pip check of all platforms runs before anything
+    is written (see `_conda_lock_header`), and the file is only replaced once all
+    entries are written, so a failure leaves the existing file untouched.
+
+    With ``artifacts``, the hashes of the package entries are first filled in and
+    verified with `_apply_artifact_hashes`. With ``explicit``, the `_ExplicitFiles`
+    of the environment are written next to it, in the same pass over the entries.
+    The metadata is rewritten with the ``mirrors`` that the entries were created
+    with. With ``dry_run``, nothing is written (see `_AtomicWriter`).
+
+    Returns:
+        Whether any file was (or, with ``dry_run``, would be) (re)written
+
+    """
+    header = _conda_lock_header(env, platforms, mirrors)
+    logging.debug("Writing conda-lock file: %s", file_path)
+    explicit_files = (
+        _ExplicitFiles(
+            file_path.parent,
+            env_name,
+            header["metadata"]["content_hash"],
+            dry_run=dry_run,
+        )
+        if explicit
+        else None
+    )
+    discard_explicit = explicit_files if explicit_files is not None else nullcontext()
+    with _AtomicWriter(file_path, dry_run=dry_run) as writer, discard_explicit:
+        _dump_conda_lock_header(header, writer.write_prefix)
+        empty = True
+        for platform, entries in zip(platforms, platform_entries):
+            if artifacts is not None:
+                _apply_artifact_hashes(entries, artifacts, profiler)
+            with _profile_stage(profiler, "write", env_name, str(platform)) as record:
+                record["packages"] = len(entries)
+                if entries and empty:
+                    writer.write("package:\n")
+                    empty = False
+                for entry in entries:
+                    _dump_package_entry(entry, writer.write)
+                    if explicit_files is not None:
+                        explicit_files.add(entry)
+        if empty:
+            writer.write("package: []\n")
+        header["metadata"]["custom_metadata"][
+            "package_digest"
+        ] = f"sha256:{writer.digest.hexdigest()}"
+        _dump_conda_lock_header(header, writer.replace_prefix)
+        changed = writer.commit()
+        if explicit_files is not None:
+            changed = explicit_files.commit() or changed
+    if not dry_run:
+        logging.debug(
+            (
+                "Successfully wrote conda-lock file: %s"
+                if changed
+                else "conda-lock file is unchanged: %s"
+            ),
+            file_path,
+        )
+    return changed
+
+
+def _write_environment(
+    output_file: Path,
+    env: Environment,
+    env_name: str,
+    platforms: list[LockPlatform],
+    platform_entries: Iterable[list[_PackageEntry]],
+    profiler: Profiler | None = None,
+    artifacts: _ArtifactHashes | None = None,
+    explicit: bool = False,  # noqa: FBT001, FBT002
+    *,
+    split: bool = False,
+    mirrors: _MirrorMap | None = None,
+    dry_run: bool = False,
+) -> bool:
+    """Write the `_output_files` of an environment with `_write_conda_lock_file`.
+
+    With ``split``, the platforms are written to their own files in turn, and all of
+    them are checked first, so an invalid platform leaves every file untouched.
+
+    Returns:
+        Whether any file was (or, with ``dry_run``, would be) (re)written
 
     """
-    lock_file = LockFile.from_path(lock_file_path)
-    conda_lock_data = _convert_env_to_conda_lock(lock_file, environment)
-    _write_yaml_file(Path(conda_lock_path), conda_lock_data)
+    if split:
+        for platform in platforms:
+            _validate_pip_in_platform_packages(platform, env.packages(platform) or [])
+    # Every file takes the entries of its own platforms from the shared iterator
+    platform_entries = iter(platform_entries)
+    changed = False
+    for file_path, file_platforms in _output_files(output_file, platforms, split=split):
+        changed = (
+            _write_conda_lock_file(
+                file_path,
+                env,
+                env_name,
+                file_platforms,
+                platform_entries,
+                profiler,
+                artifacts,
+                explicit,
+                mirrors=mirrors,
+                dry_run=dry_run,
+            )
+            or changed
+        )
+    return changed
+
+
+class _ExplicitFiles:
+    """The explicit spec files of an environment, written entry by entry.
+
+    For every platform, an ``@EXPLICIT`` file with the URLs (and md5 fragments) of
+    the conda packages, which conda installs without solving, and if there are
+    PyPI packages, a pip requirements file with their URLs and sha256 hashes (for
+    ``pip install --no-deps --require-hashes``). See `_get_explicit_filenames`.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        env_name: str,
+        content_hashes: dict[str, str],
+        *,
+        dry_run: bool = False,
+    ) -> None:
+        self.output_dir = output_dir
+        self.env_name = env_name
+        self.content_hashes = content_hashes
+        self.dry_run = dry_run
+        self.writers: dict[tuple[str, str], _AtomicWriter] = {}
+
+    def __enter__(self) -> _ExplicitFiles:  # noqa: PYI034
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        for writer in self.writers.values():
+            writer.discard()
+
+    def add(self, entry: _PackageEntry) -> None:
+        """Write the line of a package entry."""
+        writer = self.writers.get((entry.platform, entry.manager))
+        if writer is None:
+            writer = self._open(entry.platform, entry.manager)
+        if entry.manager == "conda":
+            writer.write(
+                f"{entry.url}#{entry.md5}\n" if entry.md5 else f"{entry.url}\n",
+            )
+        else:
+            hash_option = f" --hash=sha256:{entry.sha256}" if entry.sha256 else ""
+            writer.write(f"{entry.name} @ {entry.url}{hash_option}\n")
+
+    def _open(self, platform: str, manager: str) -> _AtomicWriter:
+        conda_file, pip_file = _get_explicit_filenames(
+            self.output_dir,
+            self.env_name,
+            platform,
+        )
+        writer = _AtomicWriter(
+            conda_file if manager == "conda" else pip_file,
+            dry_run=self.dry_run,
+        )
+        self.writers[platform, manager] = writer
+        writer.write(
+            "# Generated by pixi-to-conda-lock from pixi.lock\n"
+            f"# platform: {platform}\n"
+            f"# content_hash: {self.content_hashes.get(platform, '')}\n",
+        )
+        if manager == "conda":
+            writer.write("@EXPLICIT\n")
+        return writer
+
+    def commit(self) -> bool:
+        """Replace the files that changed, return whether any did."""
+        changed = [writer.commit() for writer in self.writers.values()]
+        self.writers.clear()
+        return any(changed)
+
+
+def _get_explicit_filenames(
+    output_dir: Path,
+    env_name: str,
+    platform: str,
+) -> tuple[Path, Path]:
+    """The @EXPLICIT and pip requirements filenames of an environment's platform."""
+    prefix = "" if env_name == "default" else f"{env_name}."
+    return (
+        output_dir / f"{prefix}conda-{platform}.lock",
+        output_dir / f"{prefix}requirements-{platform}.txt",
+    )
 
 
 def _setup_logging(verbose: bool = False) -> None:  # noqa: FBT001, FBT002
@@ -80,12 +649,13 @@ def _setup_logging(verbose: bool = False) -> None:  # noqa: FBT001, FBT002
         verbose: Whether to enable debug logging
 
     """
-    try:
-        from rich.logging import RichHandler
+    handlers: list[logging.Handler] = [logging.StreamHandler()]
+    # rich is slow to import, so only use it where it makes a difference
+    if sys.stderr.isatty():  # pragma: no cover
+        with suppress(ImportError):
+            from rich.logging import RichHandler
 
-        handlers = [RichHandler(rich_tracebacks=True)]
-    except ImportError:  # pragma: no cover
-        handlers = [logging.StreamHandler()]
+            handlers = [RichHandler(rich_tracebacks=True)]
 
     log_level = logging.DEBUG if verbose else logging.INFO
     logging.basicConfig(
@@ -96,48 +666,455 @@ def _setup_logging(verbose: bool = False) -> None:  # noqa: FBT001, FBT002
     )
 
 
-def _write_yaml_file(file_path: Path, data: dict[str, Any]) -> None:
-    """Write data to a YAML file."""
-    logging.debug("Writing YAML file: %s", file_path)
-    with open(file_path, "w") as f:
-        yaml.dump(data, f, sort_keys=False)
-    logging.debug("Successfully wrote YAML file: %s", file_path)
+class _AtomicWriter:
+    """Writes a file via a temporary file, which replaces it only if it changed.
+
+    Text is written (UTF-8 encoded) to a temporary file next to ``file_path``
+    while computing its digest. `commit` atomically replaces ``file_path`` with it
+    if that has a different size or digest, and otherwise removes it. Leaving the
+    context without committing (e.g., on an error) removes the temporary file.
+
+    With ``dry_run``, nothing is written: only the digest is computed, and
+    `commit` merely tells whether the file would change.
+
+    A file can start with a prefix (see `write_prefix`) that is not part of the
+    digest, e.g., a header that includes the digest of the rest of the file, and
+    that is replaced by one of the same length before committing.
+    """
+
+    def __init__(self, file_path: Path, *, dry_run: bool = False) -> None:
+        self.file_path = file_path
+        self.tmp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+        self.dry_run = dry_run
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.prefix = b""
+        self._f: BinaryIO | None = None
+        if not dry_run:
+            self._f = open(  # noqa: SIM115
+                self.tmp_path,
+                "wb",
+                buffering=_WRITE_BUFFER_SIZE,
+            )
+
+    def __enter__(self) -> _AtomicWriter:  # noqa: PYI034
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self._f is not None:
+            self.discard()
+
+    def write(self, text: str) -> None:
+        """Write text to the temporary file."""
+        data = text.encode()
+        self.size += len(data)
+        self.digest.update(data)
+        if self._f is not None:
+            self._f.write(data)
+
+    def write_prefix(self, text: str) -> None:
+        """Write the start of the file (before anything else), excluded from the digest."""
+        assert not self.size, "the prefix must be written first"
+        self.prefix = text.encode()
+        self.size = len(self.prefix)
+        if self._f is not None:
+            self._f.write(self.prefix)
+
+    def replace_prefix(self, text: str) -> None:
+        """Replace the prefix with text of the same length."""
+        prefix = text.encode()
+        if len(prefix) != len(self.prefix):
+            msg = "The prefix must keep its length"
+            raise ValueError(msg)
+        self.prefix = prefix
+        if self._f is not None:
+            self._f.seek(0)
+            self._f.write(prefix)
+            self._f.seek(0, os.SEEK_END)
+
+    def commit(self) -> bool:
+        """Replace the file if its content changed, return whether it did."""
+        content = (self.size, self.digest.hexdigest(), self.prefix)
+        if self.dry_run:
+            return not _has_content(self.file_path, *content)
+        assert self._f is not None
+        self._f.close()
+        self._f = None
+        try:
+            if _has_content(self.file_path, *content):
+                self.tmp_path.unlink()
+                return False
+            with suppress(FileNotFoundError):  # keep the permissions of the old file
+                os.chmod(self.tmp_path, stat.S_IMODE(self.file_path.stat().st_mode))
+            os.replace(self.tmp_path, self.file_path)
+        except BaseException:
+            with suppress(OSError):
+                self.tmp_path.unlink()
+            raise
+        return True
+
+    def discard(self) -> None:
+        """Remove the temporary file, leaving the file as it was."""
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        with suppress(OSError):
+            self.tmp_path.unlink()
+
+
+def _has_content(file_path: Path, size: int, digest: str, prefix: bytes = b"") -> bool:
+    """Whether a file exists with the given size, prefix and sha256 digest after it."""
+    try:
+        if file_path.stat().st_size != size:
+            return False
+        with open(file_path, "rb") as f:
+            return f.read(len(prefix)) == prefix and _stream_digest(f) == digest
+    except FileNotFoundError:
+        return False
+
+
+_WRITE_BUFFER_SIZE = 1 << 20
+# Scalars that PyYAML can emit in plain style, provided that they also do not
+# resolve to a non-string type (checked with `_resolves_to_str`).
+_PLAIN_SCALAR = re.compile(r"[A-Za-z0-9_./+=$^()~][ -~]*")
+
+
+def _yaml_dumper() -> Any:
+    """PyYAML's safe dumper, using libyaml's C implementation when available."""
+    import yaml
+
+    return getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+@functools.cache
+def _implicit_resolvers() -> dict[str | None, list[tuple[str, re.Pattern]]]:
+    """The regular expressions with which PyYAML resolves plain scalars to types."""
+    import yaml
+
+    return yaml.resolver.Resolver.yaml_implicit_resolvers
+
+
+def _resolves_to_str(value: str) -> bool:
+    """Whether a plain YAML scalar is loaded back as a string (and not e.g. a float)."""
+    implicit_resolvers = _implicit_resolvers()
+    resolvers = implicit_resolvers.get(value[0], []) + implicit_resolvers.get(
+        None,
+        [],
+    )
+    return not any(regexp.match(value) for _, regexp in resolvers)
+
+
+def _format_yaml_scalar(value: Any) -> str:
+    """Format a scalar as a YAML flow scalar that loads back to the same value."""
+    if isinstance(value, str):
+        if (
+            _PLAIN_SCALAR.fullmatch(value)
+            and not value.endswith((" ", ":"))
+            and ": " not in value
+            and " #" not in value
+            and _resolves_to_str(value)
+        ):
+            return value
+        if value.isprintable():
+            return "'" + value.replace("'", "''") + "'"
+        return json.dumps(value)  # a JSON string is a valid double-quoted YAML scalar
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None or isinstance(value, int):
+        return "null" if value is None else str(value)
+    import yaml
+
+    return yaml.dump(value, Dumper=_yaml_dumper()).split("\n", 1)[0]
+
+
+def _is_list(value: Any) -> bool:
+    """Whether value is a non-empty list (which is written in block style)."""
+    return isinstance(value, list) and bool(value)
+
+
+def _dump_yaml_block(value: Any, indent: str, write: Callable[[str], Any]) -> None:
+    """Write the block-style YAML for the value of a mapping key (after the colon)."""
+    if isinstance(value, dict) and value:
+        write("\n")
+        for key, item in value.items():
+            write(f"{indent}{_format_yaml_scalar(key)}:")
+            # Like `yaml.dump`, lists are not indented relative to their key
+            _dump_yaml_block(item, indent if _is_list(item) else indent + "  ", write)
+    elif isinstance(value, list) and value:
+        write("\n")
+        for item in value:
+            if isinstance(item, dict) and item:
+                first = True
+                for key, sub_item in item.items():
+                    prefix = f"{indent}- " if first else f"{indent}  "
+                    write(f"{prefix}{_format_yaml_scalar(key)}:")
+                    sub_indent = (
+                        indent + "  " if _is_list(sub_item) else indent + "    "
+                    )
+                    _dump_yaml_block(sub_item, sub_indent, write)
+                    first = False
+            else:
+                write(f"{indent}-")
+                _dump_yaml_block(item, indent + "  ", write)
+    elif isinstance(value, dict):
+        write(" {}\n")
+    elif isinstance(value, list):
+        write(" []\n")
+    else:
+        write(f" {_format_yaml_scalar(value)}\n")
+
+
+def _dump_package_entry(
+    entry: Mapping[str, Any],
+    write: Callable[[str], Any],
+) -> None:
+    """Write a single `package` list item of a conda-lock file.
+
+    Package entries are flat mappings whose values are scalars or flat mappings of
+    scalars (`dependencies` and `hash`), so this avoids the generic recursion. A
+    `_PackageEntry` is written straight from its fields.
+    """
+    if isinstance(entry, _PackageEntry):
+        lines = [
+            f"- name: {_format_yaml_scalar(entry.name)}\n",
+            f"  version: {_format_yaml_scalar(entry.version)}\n",
+            f"  manager: {entry.manager}\n",
+            f"  platform: {entry.platform}\n",
+        ]
+        _dump_flat_mapping("dependencies", entry.dependencies, lines)
+        lines.append(f"  url: {_format_yaml_scalar(entry.url)}\n")
+        if entry.md5 is None and entry.sha256 is None:
+            lines.append("  hash: {}\n")
+        else:
+            lines.append("  hash:\n")
+            if entry.md5 is not None:
+                lines.append(f"    md5: {_format_yaml_scalar(entry.md5)}\n")
+            if entry.sha256 is not None:
+                lines.append(f"    sha256: {_format_yaml_scalar(entry.sha256)}\n")
+        if entry.optional:
+            lines.append(
+                f"  category: {_format_yaml_scalar(entry.category)}\n"
+                "  optional: true\n",
+            )
+        else:
+            lines.append("  category: main\n  optional: false\n")
+        write("".join(lines))
+        return
+    lines = []
+    prefix = "- "
+    for key, value in entry.items():
+        if isinstance(value, dict):
+            _dump_flat_mapping(key, value, lines, prefix)
+        else:
+            lines.append(f"{prefix}{key}: {_format_yaml_scalar(value)}\n")
+        prefix = "  "
+    write("".join(lines))
+
+
+def _dump_flat_mapping(
+    key: str,
+    value: dict[str, Any],
+    lines: list[str],
+    prefix: str = "  ",
+) -> None:
+    """Append the lines of a mapping of scalars in a package entry."""
+    if not value:
+        lines.append(f"{prefix}{key}: {{}}\n")
+        return
+    lines.append(f"{prefix}{key}:\n")
+    lines.extend(
+        f"    {_format_yaml_scalar(k)}: {_format_yaml_scalar(v)}\n"
+        for k, v in value.items()
+    )
+
+
+def _dump_conda_lock(data: dict[str, Any], write: Callable[[str], Any]) -> None:
+    """Write conda-lock (v1) data as YAML.
+
+    A schema-specific replacement for `yaml.dump`, which is the bottleneck for large
+    lock files. The output loads back to the same data as that of `yaml.dump`.
+    """
+    _dump_conda_lock_header(data, write)
+    _dump_package_section(data["package"], write)
+
+
+def _dump_conda_lock_header(data: dict[str, Any], write: Callable[[str], Any]) -> None:
+    """Write the `version` and `metadata` of conda-lock data, which precede `package`.
+
+    The header is written in a single call of write.
+    """
+    chunks = [f"version: {_format_yaml_scalar(data['version'])}\n", "metadata:"]
+    _dump_yaml_block(data["metadata"], "  ", chunks.append)
+    write("".join(chunks))
+
+
+def _dump_package_section(
+    entries: Iterable[Mapping[str, Any]],
+    write: Callable[[str], Any],
+) -> None:
+    """Write the `package` section of conda-lock data, which ends the file."""
+    empty = True
+    for entry in entries:
+        if empty:
+            write("package:\n")
+            empty = False
+        _dump_package_entry(entry, write)
+    if empty:
+        write("package: []\n")
+
+
+def _package_digest(entries: Iterable[Mapping[str, Any]]) -> str:
+    """The sha256 hex digest of the `package` section with the entries."""
+    digest = hashlib.sha256()
+    _dump_package_section(entries, lambda text: digest.update(text.encode()))
+    return digest.hexdigest()
+
+
+class _PackageEntry(Mapping):
+    """A compact, read-only `package` entry of a conda-lock file.
+
+    Conversions of large lock files create hundreds of thousands of entries, so
+    instead of a dict with nested `hash` and `dependencies` dicts per package, this
+    stores the fields in slots, shares the constant ones (`category` and
+    `optional`) and is written by `_dump_package_entry` without building any dicts.
+
+    It is also a `Mapping` with the keys (in order) and values of the conda-lock
+    entry, so it compares equal to the equivalent dict, and `to_dict` returns one.
+    """
+
+    __slots__ = (
+        "dependencies",
+        "manager",
+        "md5",
+        "name",
+        "platform",
+        "sha256",
+        "url",
+        "version",
+    )
+    _KEYS = (
+        "name",
+        "version",
+        "manager",
+        "platform",
+        "dependencies",
+        "url",
+        "hash",
+        "category",
+        "optional",
+    )
+    category = "main"
+    optional = False
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        manager: str,
+        platform: str,
+        dependencies: dict[str, str],
+        url: str,
+        md5: str | None = None,
+        sha256: str | None = None,
+    ) -> None:
+        self.name = name
+        self.version = version
+        self.manager = sys.intern(manager)
+        self.platform = sys.intern(platform)
+        self.dependencies = dependencies
+        self.url = url
+        self.md5 = md5
+        self.sha256 = sha256
+
+    @property
+    def hash(self) -> dict[str, str]:
+        """The `hash` mapping of the entry."""
+        hashes = {}
+        if self.md5 is not None:
+            hashes["md5"] = self.md5
+        if self.sha256 is not None:
+            hashes["sha256"] = self.sha256
+        return hashes
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (
+            type(self),
+            (
+                self.name,
+                self.version,
+                self.manager,
+                self.platform,
+                self.dependencies,
+                self.url,
+                self.md5,
+                self.sha256,
+            ),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """The entry as a (new) dict."""
+        return {key: getattr(self, key) for key in self._KEYS}
+
+
+class _OptionalPackageEntry(_PackageEntry):
+    """A `_PackageEntry` in an optional category (see `_MergedEnvironment`)."""
+
+    __slots__ = ("category",)
+    optional = True
+
+    def __init__(self, entry: _PackageEntry, category: str) -> None:
+        super().__init__(*_PackageEntry.__reduce__(entry)[1])
+        self.category = sys.intern(category)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (
+            type(self),
+            (_PackageEntry(*super().__reduce__()[1]), self.category),
+        )
 
 
 def _create_conda_package_entry(
     package: CondaLockedPackage,
     platform: Platform,
     repodata_record: RepoDataRecord,
-) -> dict[str, Any]:
+) -> _PackageEntry:
     """Create a conda package entry for conda-lock.yml from repodata."""
     logging.debug(
         "Creating conda package entry from repodata for: %s",
         package.location,
     )
 
-    package_entry = {
-        "name": repodata_record.name.source,
-        "version": str(repodata_record.version),
-        "manager": "conda",
-        "platform": str(platform),
-        "dependencies": _list_of_str_dependencies_to_dict(
+    package_entry = _PackageEntry(
+        name=repodata_record.name.source,
+        version=str(repodata_record.version),
+        manager="conda",
+        platform=str(platform),
+        dependencies=_list_of_str_dependencies_to_dict(
             package.package_record.depends,
         ),
-        "url": package.location,
-        "hash": {
-            "md5": repodata_record.md5.hex(),
-        },
-        "category": "main",
-        "optional": False,
-    }
-
-    if repodata_record.sha256:
-        package_entry["hash"]["sha256"] = repodata_record.sha256.hex()
+        url=package.location,
+        md5=repodata_record.md5.hex(),
+        sha256=repodata_record.sha256.hex() if repodata_record.sha256 else None,
+    )
 
     logging.debug(
         "Created conda package entry: %s v%s",
-        package_entry["name"],
-        package_entry["version"],
+        package_entry.name,
+        package_entry.version,
     )
     return package_entry
 
@@ -145,48 +1122,125 @@ def _create_conda_package_entry(
 def _create_pypi_package_entry(
     package: PypiLockedPackage,
     platform: Platform,
-) -> dict[str, Any]:
+) -> _PackageEntry:
     """Create a conda-lock package entry from a PypiLockedPackage."""
-    package_entry = {
-        "name": package.name,
-        "version": str(package.version),
-        "manager": "pip",
-        "platform": str(platform),
-        "dependencies": _list_of_str_dependencies_to_dict(package.requires_dist),
-        "url": _format_pypi_package_url(package.location),
-        "hash": {},
-        "category": "main",
-        "optional": False,
-    }
+    sha256 = None
     if package.hashes:
         with suppress(AttributeError):
-            package_entry["hash"] = {"sha256": package.hashes.sha256.hex()}
-    return package_entry
+            sha256 = package.hashes.sha256.hex()
+    return _PackageEntry(
+        name=package.name,
+        version=str(package.version),
+        manager="pip",
+        platform=str(platform),
+        dependencies=_list_of_str_dependencies_to_dict(package.requires_dist),
+        url=_format_pypi_package_url(package.location),
+        sha256=sha256,
+    )
+
+
+class _Dependencies(dict):
+    """A read-only dependencies mapping of a package entry.
+
+    Instances are shared between all package entries with the same requirements
+    (see `_list_of_str_dependencies_to_dict`), so they must not be modified.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args: Any, **kwargs: Any) -> Any:  # noqa: ARG002
+        msg = "Dependencies of a package entry are read-only"
+        raise TypeError(msg)
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Unpickling (e.g., results from worker processes) goes through the cache
+        return _shared_dependencies, (tuple(self.items()),)
+
+
+@functools.cache
+def _register_yaml_representers() -> None:
+    """Let PyYAML dump `_Dependencies` and `_PackageEntry` (once, when first needed)."""
+    import yaml
+
+    def represent_entry(
+        dumper: yaml.representer.SafeRepresenter,
+        entry: _PackageEntry,
+    ) -> yaml.Node:
+        return dumper.represent_dict(entry.to_dict())
+
+    for representer in (yaml.representer.SafeRepresenter, yaml.representer.Representer):
+        representer.add_representer(
+            _Dependencies,
+            yaml.representer.SafeRepresenter.represent_dict,
+        )
+        representer.add_representer(_PackageEntry, represent_entry)
 
 
 def _list_of_str_dependencies_to_dict(dependencies_list: list[str]) -> dict[str, str]:
-    """Convert package requirements from 'dependencies' format to conda-lock format."""
-    dependencies = {}
-    for requirement in dependencies_list:
-        # Split by first occurrence of any version specifier
-        match = re.match(r"([^<>=!~]+)(.+)?", requirement)
-        if match:
-            package_name = match.group(1).strip()
-            version_constraint = match.group(2) or "*"
-            dependencies[package_name] = version_constraint.strip()
+    """Convert package requirements from 'dependencies' format to conda-lock format.
+
+    The returned mapping is read-only and shared between all callers that pass the
+    same requirements, e.g., the same noarch package on every platform.
+    """
+    return _parse_dependencies(tuple(dependencies_list))
+
+
+@functools.lru_cache(maxsize=2**16)
+def _parse_dependencies(requirements: tuple[str, ...]) -> _Dependencies:
+    """Parse requirements into a shared, read-only mapping (memoized)."""
+    return _shared_dependencies(tuple(_parse_requirements(requirements).items()))
+
+
+def _parse_requirements(requirements: Iterable[str]) -> dict[str, str]:
+    """Split conda MatchSpecs or PEP 508 requirements into {name: rest}.
 
+    The name ends at the first whitespace, version operator, extras bracket,
+    environment marker, ``(`` or ``@``, and everything after it (the version and
+    build string of a MatchSpec, or the extras, version, URL and marker of a PEP
+    508 requirement) is kept verbatim, or ``*`` if there is nothing. So
+    ``python >=3.9,<3.10.0a0 *_cpython`` gives ``python: >=3.9,<3.10.0a0 *_cpython``
+    and ``foo[bar]>=1; python_version<"3.10"`` gives
+    ``foo: [bar]>=1; python_version<"3.10"``. Later requirements for the same name
+    replace earlier ones, except that a requirement with an environment marker
+    (e.g., only for an extra) does not replace a version constraint without one,
+    which always applies.
+
+    The whole list is parsed with a single `re.Pattern.findall` over the joined
+    requirements, instead of matching and stripping every one in Python.
+    """
+    dependencies: dict[str, str] = {}
+    for name, rest in _REQUIREMENT.findall("\n".join(requirements)):
+        previous = dependencies.get(name, "*")
+        if ";" in rest and previous != "*" and ";" not in previous:
+            continue
+        dependencies[name] = rest or "*"
     return dependencies
 
 
+@functools.lru_cache(maxsize=2**16)
+def _shared_dependencies(items: tuple[tuple[str, str], ...]) -> _Dependencies:
+    """The single shared mapping with interned strings for the given items."""
+    _register_yaml_representers()
+    return _Dependencies((sys.intern(name), sys.intern(spec)) for name, spec in items)
+
+
+# One requirement per line: the name, then the rest without surrounding whitespace
+_REQUIREMENT = re.compile(r"^[ \t]*([^\s<>=!~\[;(@,]+)[ \t]*(.*\S)?", re.MULTILINE)
+
+
 def _create_conda_lock_metadata(
     platforms: list[Platform],
     channels: list[dict[str, Any]],
+    content_hashes: dict[str, str],
 ) -> dict[str, Any]:
     """Create metadata section for conda-lock.yml."""
     logging.debug("Creating conda-lock metadata")
     metadata = {
         "content_hash": {
-            str(platform): "generated-from-pixi-lock" for platform in platforms
+            str(platform): content_hashes[str(platform)] for platform in platforms
         },
         "channels": channels,
         "platforms": [str(p) for p in platforms],
@@ -199,76 +1253,785 @@ def _create_conda_lock_metadata(
 def _convert_env_to_conda_lock(
     lock_file: LockFile,
     env_name: str,
+    profiler: Profiler | None = None,
+    index: _PackageIndex | None = None,
+    platforms: Iterable[str | Platform] | None = None,
+    only: Iterable[str] | None = None,
 ) -> dict[str, Any]:
-    """Convert a lock file to a conda-lock dict for a specific environment."""
+    """Convert a lock file to a conda-lock dict for a specific environment.
+
+    Pass the same ``index`` when converting several environments of a lock file, so
+    that packages they share are only looked up and built once. With ``platforms``,
+    only those of the environment's platforms are converted (and listed in the
+    metadata), the others are not looked at. The URLs are rewritten with the
+    mirrors of the ``index``, if any. With ``only``, only those packages and their
+    dependencies are converted.
+    """
     logging.info("Converting pixi lock file to conda-lock format for %s", env_name)
-    conda_lock_data: dict[str, Any] = {
-        "version": 1,
-        "metadata": {},
-        "package": [],
-    }
+    env = _get_environment(lock_file, env_name, only)
+    env_platforms = _select_platforms(env, platforms, strict=False)
+    index = index if index is not None else _PackageIndex()
+    conda_lock_data = _conda_lock_header(env, env_platforms, index.mirrors)
+    conda_lock_data["package"] = [
+        entry
+        for entries in _iter_platform_entries(
+            env,
+            env_platforms,
+            env_name,
+            profiler,
+            index,
+        )
+        for entry in entries
+    ]
+    conda_lock_data["metadata"]["custom_metadata"][
+        "package_digest"
+    ] = f"sha256:{_package_digest(conda_lock_data['package'])}"
+    return conda_lock_data
+
+
+def _iter_platform_entries(
+    env: Environment,
+    platforms: list[LockPlatform],
+    env_name: str | None = None,
+    profiler: Profiler | None = None,
+    index: _PackageIndex | None = None,
+) -> Iterator[list[_PackageEntry]]:
+    """Lazily convert the platforms of an environment, yielding their entries in turn."""
+    index = index if index is not None else _PackageIndex()
+    for platform in platforms:
+        entries = _convert_platform(env, platform, env_name, profiler, index).entries
+        if isinstance(env, _MergedEnvironment):
+            entries = env.categorize(platform, entries)
+        yield entries
+
 
+def _get_environment(
+    lock_file: LockFile,
+    env_name: str,
+    only: Iterable[str] | None = None,
+) -> Environment:
+    """Get an environment from the lock file or raise if it does not exist.
+
+    With ``only``, the environment only has the packages that those packages
+    (transitively) depend on (see `_PrunedEnvironment`).
+    """
     env = lock_file.environment(env_name)
     if env is None:
         msg = f"Environment '{env_name}' not found in pixi.lock file"
         raise ValueError(msg)
-    platforms = env.platforms()
-    channels = [
-        {"url": str(c).replace("https://conda.anaconda.org/", ""), "used_env_vars": []}
-        for c in env.channels()
-    ]
-    conda_lock_data["metadata"] = _create_conda_lock_metadata(platforms, channels)
-    has_pypi_packages: dict[str, bool] = {platform: False for platform in platforms}
-    has_pip: dict[str, bool] = {platform: False for platform in platforms}
-    for platform in platforms:
-        conda_repodata = env.conda_repodata_records_for_platform(platform)
-        repo_mapping = (
-            {record.url: record for record in conda_repodata}
-            if conda_repodata is not None
-            else {}
-        )
-        for package in env.packages(platform):
-            if isinstance(package, CondaLockedPackage):
-                url = package.location
-                repodata_record = repo_mapping[url]
-                conda_package_entry = _create_conda_package_entry(
-                    package,
-                    platform,
-                    repodata_record,
-                )
-                conda_lock_data["package"].append(conda_package_entry)
-                if repodata_record.name.source == "pip":
-                    has_pip[platform] = True
-                continue
-            assert isinstance(package, PypiLockedPackage)
-            has_pypi_packages[platform] = True
-            pypi_package_entry = _create_pypi_package_entry(package, platform)
-            conda_lock_data["package"].append(pypi_package_entry)
-    _validate_pip_in_conda_packages(has_pypi_packages, has_pip)
-    return conda_lock_data
+    if only:
+        return cast("Environment", _PrunedEnvironment(env, env_name, only))
+    return env
 
 
-def _validate_pip_in_conda_packages(
-    has_pypi_packages: dict[str, bool],
-    has_pip: dict[str, bool],
-) -> None:
-    for platform, has_pypi in has_pypi_packages.items():
-        if has_pypi and not has_pip[platform]:
-            msg = (
-                "❌ PyPI packages are present but no pip package found in conda packages."
-                " Please ensure that pip is included in your pixi.lock file."
-            )
-            raise ValueError(msg)
+class _PrunedEnvironment:
+    """An environment with only the packages that the given ones depend on.
+
+    The packages of a platform are pruned to the transitive closure of ``only``
+    (see `_reachable_packages`) once, when they are first requested, everything
+    else is delegated to the environment. Because the content hashes, the
+    fingerprints, the entries and the explicit files are all derived from
+    `packages`, a pruned environment converts like any other one.
+    """
+
+    def __init__(self, env: Environment, env_name: str, only: Iterable[str]) -> None:
+        self._env = env
+        self._env_name = env_name
+        self._only = [_normalize_package_name(name) for name in only]
+        self._packages: dict[str, list[LockedPackage]] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._env, name)
+
+    def packages(self, platform: LockPlatform) -> list[LockedPackage]:
+        """The packages of the platform that are reachable from ``only``."""
+        key = str(platform)
+        if key not in self._packages:
+            packages = self._env.packages(platform) or []
+            reachable, missing = _reachable_packages(packages, self._only)
+            if missing:
+                logging.warning(
+                    "Package(s) %s not found in environment '%s' on %s",
+                    ", ".join(missing),
+                    self._env_name,
+                    key,
+                )
+            logging.debug(
+                "Keeping %d of the %d packages of '%s' on %s",
+                len(reachable),
+                len(packages),
+                self._env_name,
+                key,
+            )
+            self._packages[key] = reachable
+        return self._packages[key]
+
+
+def _reachable_packages(
+    packages: list[LockedPackage],
+    roots: list[str],
+) -> tuple[list[LockedPackage], list[str]]:
+    """The packages that the roots (transitively) depend on, and the missing roots.
+
+    The packages are indexed by their normalized name, and the dependency graph
+    (from `_list_of_str_dependencies_to_dict`) is walked from the roots, so this
+    takes time linear in the packages and their dependencies. Names that are not
+    in the platform (e.g., virtual packages like ``__glibc``) are skipped. PyPI
+    packages also depend on ``pip``, which installs them, and the requirements of
+    their extras are not followed. The reachable packages keep their order.
+    """
+    from rattler import CondaLockedPackage
+
+    by_name: dict[str, list[int]] = {}
+    for i, package in enumerate(packages):
+        by_name.setdefault(_normalize_package_name(package.name), []).append(i)
+    missing = [name for name in roots if name not in by_name]
+    reachable: set[int] = set()
+    stack = list(roots)
+    while stack:
+        # Popping the name marks its packages as visited
+        for i in by_name.pop(stack.pop(), ()):
+            reachable.add(i)
+            package = packages[i]
+            if isinstance(package, CondaLockedPackage):
+                dependencies = _list_of_str_dependencies_to_dict(
+                    package.package_record.depends,
+                )
+                stack.extend(map(_normalize_package_name, dependencies))
+            else:
+                stack.append("pip")
+                # A name is followed if any of its requirements is not for an extra
+                stack.extend(
+                    _normalize_package_name(name)
+                    for name, rest in _REQUIREMENT.findall(
+                        "\n".join(package.requires_dist or []),
+                    )
+                    if not _EXTRA_MARKER.search(rest)
+                )
+    return [package for i, package in enumerate(packages) if i in reachable], missing
+
+
+def _normalize_package_name(name: str) -> str:
+    """A package name as compared by `--only` (PEP 503, e.g., ``typing-extensions``)."""
+    return _NAME_SEPARATORS.sub("-", name).lower()
+
+
+def _package_selection(only: Iterable[str] | None) -> list[str] | None:
+    """The sorted normalized names of `--only`, None for all (as stored in the cache)."""
+    return sorted({_normalize_package_name(name) for name in only}) if only else None
+
+
+_NAME_SEPARATORS = re.compile(r"[-_.]+")
+# A PEP 508 marker that limits a requirement to an extra, e.g., ``extra == 'test'``
+_EXTRA_MARKER = re.compile(r"\bextra\s*==")
+
+
+class _MergedEnvironment:
+    """Several environments as one, whose packages are deduplicated by category.
+
+    Per platform, the packages that every environment with the platform has are
+    in the ``main`` category, and the others are optional, in a category named
+    after the environments that have them, joined by ``+`` (e.g., ``dev+test``,
+    see `categories`). Every package is listed exactly once, because conda-lock
+    keeps a single entry (and category) per package and platform, so environments
+    that lock different versions of a package cannot be merged (see
+    `_check_mergeable`). An environment
+    is installed with the ``main`` category and the extras whose names contain
+    it. The entries (created once per package by `_PackageIndex`) and the output
+    scale with the unique packages instead of the sum of the environments.
+    """
+
+    def __init__(self, envs: dict[str, Environment]) -> None:
+        # `LockFile.environments` returns the environments in hash order
+        self._envs = dict(sorted(envs.items()))
+        self._platforms = {
+            env_name: {str(platform) for platform in env.platforms()}
+            for env_name, env in envs.items()
+        }
+        self._packages: dict[str, tuple[list[LockedPackage], list[str]]] = {}
+
+    def platforms(self) -> list[LockPlatform]:
+        """The platforms that any of the environments has."""
+        platforms: dict[str, LockPlatform] = {}
+        for env in self._envs.values():
+            for platform in env.platforms():
+                platforms.setdefault(str(platform), platform)
+        return list(platforms.values())
+
+    def channels(self) -> list[Any]:
+        """The channels of all environments, in order of appearance."""
+        channels: dict[str, Any] = {}
+        for env in self._envs.values():
+            for channel in env.channels():
+                channels.setdefault(str(channel), channel)
+        return list(channels.values())
+
+    def packages(self, platform: LockPlatform) -> list[LockedPackage]:
+        """The (unique) packages of the platform: ``main`` first, then the extras."""
+        return self._merge(platform)[0]
+
+    def categories(self, platform: LockPlatform) -> list[str]:
+        """The category of each of the `packages` of the platform."""
+        return self._merge(platform)[1]
+
+    def conda_repodata_records_for_platform(
+        self,
+        platform: LockPlatform,
+    ) -> list[RepoDataRecord]:
+        """The repodata records of the platform in all environments."""
+        return [
+            record
+            for env_name, env in self._envs.items()
+            if str(platform) in self._platforms[env_name]
+            for record in env.conda_repodata_records_for_platform(platform) or []
+        ]
+
+    def categorize(
+        self,
+        platform: LockPlatform,
+        entries: list[_PackageEntry],
+    ) -> list[_PackageEntry]:
+        """Put the entries of the `packages` of the platform in their categories."""
+        return [
+            entry if category == "main" else _OptionalPackageEntry(entry, category)
+            for entry, category in zip(entries, self.categories(platform))
+        ]
+
+    def _merge(self, platform: LockPlatform) -> tuple[list[LockedPackage], list[str]]:
+        key = str(platform)
+        if key not in self._packages:
+            env_names = [
+                env_name for env_name in self._envs if key in self._platforms[env_name]
+            ]
+            # The environments with each package, by location in order of appearance
+            by_location: dict[str, tuple[LockedPackage, list[str]]] = {}
+            for env_name in env_names:
+                for package in self._envs[env_name].packages(platform) or []:
+                    _, names = by_location.setdefault(package.location, (package, []))
+                    names.append(env_name)
+            _check_mergeable(key, list(by_location.values()))
+            # Packages in all environments are also in the first one, in its order
+            merged = sorted(
+                by_location.values(),
+                key=lambda item: len(item[1]) < len(env_names),
+            )
+            self._packages[key] = (
+                [package for package, _ in merged],
+                [
+                    "main" if len(names) == len(env_names) else "+".join(names)
+                    for _, names in merged
+                ],
+            )
+        return self._packages[key]
+
+
+def _check_mergeable(
+    platform: str,
+    packages: list[tuple[LockedPackage, list[str]]],
+) -> None:
+    """Raise if environments lock different artifacts of the same package.
+
+    conda-lock keeps a single entry per (platform, manager, name), so a merged file
+    cannot hold, e.g., ``bzip2 1.0.8`` for one environment and ``1.0.9`` for another.
+    """
+    from rattler import CondaLockedPackage
+
+    by_name: dict[tuple[str, str], list[tuple[LockedPackage, list[str]]]] = {}
+    for package, env_names in packages:
+        manager = "conda" if isinstance(package, CondaLockedPackage) else "pip"
+        by_name.setdefault((manager, package.name), []).append((package, env_names))
+    conflicts = [
+        f"{manager} package '{name}' ("
+        + ", ".join(
+            f"{package.location} in {', '.join(env_names)}"
+            for package, env_names in locked
+        )
+        + ")"
+        for (manager, name), locked in by_name.items()
+        if len(locked) > 1
+    ]
+    if conflicts:
+        msg = (
+            f"❌ Cannot merge the environments on {platform}, conda-lock keeps a single"
+            " entry per package and platform, but they lock different versions or"
+            f" builds of: {'; '.join(conflicts)}. Convert them without --merge."
+        )
+        raise ValueError(msg)
+
+
+def _package_categories(
+    env: Environment,
+    platform: LockPlatform,
+) -> list[str] | None:
+    """The categories of the packages of a `_MergedEnvironment`, None if all main."""
+    if isinstance(env, _MergedEnvironment):
+        return env.categories(platform)
+    return None
+
+
+def _sorted_platforms(env: Environment) -> list[LockPlatform]:
+    """Get the platforms of an environment in a deterministic (sorted) order.
+
+    `Environment.platforms` returns the platforms in hash order, which differs
+    between processes.
+    """
+    return sorted(env.platforms(), key=str)
+
+
+def _convert_platform(
+    env: Environment,
+    platform: LockPlatform,
+    env_name: str | None = None,
+    profiler: Profiler | None = None,
+    index: _PackageIndex | None = None,
+) -> _PlatformResult:
+    """Create the conda-lock package entries for a single platform of an environment."""
+    index = index if index is not None else _PackageIndex()
+    packages = env.packages(platform) or []
+    with _profile_stage(profiler, "repodata", env_name, str(platform)) as record:
+        record["packages"] = index.add_repodata_records(env, platform, packages)
+    with _profile_stage(profiler, "entries", env_name, str(platform)) as record:
+        result = index.platform_entries(platform, packages)
+        record["packages"] = len(result.entries)
+    return result
+
+
+class _PackageIndex:
+    """Repodata records and package entries shared by all environments of a lock file.
+
+    The entries are keyed by the URL, platform and hashes of their package (see
+    `_index_key`), so every package is looked up and converted once, no matter
+    how many environments (or versions of the lock file) contain it. The
+    repodata records of an environment's platform are only requested from
+    rattler if it has a conda package that is not yet indexed, and only those of
+    the packages without an entry are kept (by URL and platform), until their
+    entries are created. With ``mirrors``, the URLs of the entries are rewritten
+    when they are created (so once per package).
+
+    All entries are kept for later conversions (e.g., of other lock files in a
+    batch), unless the conversions are announced with `plan`: then an entry is only
+    kept while another of them will reuse it, so memory does not grow with the
+    number of packages of all environments.
+    """
+
+    def __init__(self, mirrors: _MirrorMap | None = None) -> None:
+        self.mirrors = mirrors
+        self.records: dict[tuple[str, str], RepoDataRecord] = {}
+        self.entries: dict[_IndexKey, _PackageEntry] = {}
+        self.uses: dict[_IndexKey, int] | None = None
+
+    def plan(self, envs: Iterable[tuple[Environment, list[LockPlatform]]]) -> None:
+        """Announce the platforms of the environments that will be converted.
+
+        Entries are then released once the last of these conversions got them.
+        """
+        self.uses = {}
+        for env, platforms in envs:
+            for platform in platforms:
+                platform_name = str(platform)
+                for package in env.packages(platform) or []:
+                    key = _index_key(package, platform_name)
+                    if key is not None:
+                        self.uses[key] = self.uses.get(key, 0) + 1
+
+    def add_repodata_records(
+        self,
+        env: Environment,
+        platform: LockPlatform,
+        packages: list[LockedPackage],
+    ) -> int:
+        """Index the repodata records of a platform if needed, return the number added."""
+        from rattler import CondaLockedPackage
+
+        platform_name = str(platform)
+        missing = {
+            (package.location, platform_name)
+            for package in packages
+            if isinstance(package, CondaLockedPackage)
+            and _index_key(package, platform_name) not in self.entries
+        }
+        if not missing:
+            return 0
+        n_records = 0
+        for record in env.conda_repodata_records_for_platform(platform) or []:
+            key = (record.url, platform_name)
+            if key in missing:
+                self.records[key] = record
+                n_records += 1
+        return n_records
+
+    def platform_entries(
+        self,
+        platform: LockPlatform,
+        packages: list[LockedPackage],
+    ) -> _PlatformResult:
+        """The package entries of a platform, creating those not yet in the index."""
+        return _PlatformResult(list(self.iter_entries(platform, packages)))
+
+    def iter_entries(
+        self,
+        platform: LockPlatform,
+        packages: list[LockedPackage],
+    ) -> Iterator[_PackageEntry]:
+        """Yield the package entries of a platform, creating them when first needed.
+
+        The repodata records of the platform must have been added with
+        `add_repodata_records`.
+        """
+        from rattler import CondaLockedPackage, PypiLockedPackage
+
+        platform_name = str(platform)
+        for package in packages:
+            key = _index_key(package, platform_name)
+            entry = self.entries.get(key) if key is not None else None
+            if entry is None:
+                if isinstance(package, CondaLockedPackage):
+                    entry = _create_conda_package_entry(
+                        package,
+                        platform,
+                        self.records.pop((package.location, platform_name)),
+                    )
+                else:
+                    assert isinstance(package, PypiLockedPackage)
+                    entry = _create_pypi_package_entry(package, platform)
+                if self.mirrors is not None:
+                    entry.url = self.mirrors.rewrite(entry.url)
+            yield self.share(key, entry)
+
+    def share(self, key: _IndexKey | None, entry: _PackageEntry) -> _PackageEntry:
+        """The indexed entry of key (entry if there is none), kept if it is reused."""
+        if key is None:
+            return entry
+        entry = self.entries.get(key, entry)
+        if self.uses is None:
+            self.entries[key] = entry
+            return entry
+        remaining = self.uses.pop(key, 1) - 1
+        if remaining > 0:
+            self.uses[key] = remaining
+            self.entries[key] = entry
+        else:
+            self.entries.pop(key, None)
+        return entry
+
+
+# The URL, platform, md5 and sha256 of a package
+_IndexKey = tuple[str, str, str, str]
+
+
+def _index_key(package: LockedPackage, platform_name: str) -> _IndexKey | None:
+    """The key of the entry of a package in `_PackageIndex`, None to not share it.
+
+    The URL and hashes identify the locked artifact, and with it everything its
+    entry is created from, even across versions of a lock file (e.g., in
+    ``--watch``) and across the lock files of a batch. Packages without a hash or
+    with a relative location (e.g., an editable ``pypi: .``, relative to its lock
+    file) are not shared, because their entries could differ under the same key.
+    """
+    if "://" not in package.location:
+        return None
+    md5, sha256 = _package_hashes(
+        cast("CondaLockedPackage | PypiLockedPackage", package),
+    )
+    if not (md5 or sha256):
+        return None
+    return (package.location, platform_name, md5, sha256)
+
+
+def _planned_index(
+    envs: list[Environment],
+    selected_platforms: Iterable[str | Platform] | None,
+    mirrors: _MirrorMap | None = None,
+) -> _PackageIndex:
+    """A package index that only keeps the entries reused by the environments."""
+    index = _PackageIndex(mirrors)
+    index.plan(
+        (env, _select_platforms(env, selected_platforms, strict=False)) for env in envs
+    )
+    return index
+
+
+def _content_hash(
+    packages: list[LockedPackage],
+    mirrors: _MirrorMap | None = None,
+    categories: list[str] | None = None,
+) -> str:
+    """The `content_hash` of a platform: a digest of its locked packages.
+
+    The packages are added in the order in which their entries are written, and the
+    digest covers every field that their entries are created from (manager, name,
+    version, URL, the hashes from the lock file and the requirements). So identical
+    package sets give identical hashes, and any change to them gives a different one,
+    also for packages without hashes (e.g., an editable ``pypi: .``). It is computed
+    from the lock file alone (with the URLs rewritten by ``mirrors``, like those of
+    the entries), so it is known before any entry is created. The ``categories``
+    of the packages, if not all ``main``, are included too.
+    """
+    from rattler import CondaLockedPackage
+
+    digest = hashlib.sha256()
+    for i, package in enumerate(packages):
+        md5, sha256 = _package_hashes(package)
+        if isinstance(package, CondaLockedPackage):
+            manager, url = "conda", package.location
+        else:
+            # conda-lock has no md5 for pip packages
+            manager, url, md5 = "pip", _format_pypi_package_url(package.location), ""
+        if mirrors is not None:
+            url = mirrors.rewrite(url)
+        category = f"\0{categories[i]}" if categories is not None else ""
+        requirements = "\0".join(_package_requirements(package))
+        digest.update(
+            f"{manager}\0{package.name}\0{package.version}\0{url}"
+            f"\0{md5}\0{sha256}\0{requirements}{category}\n".encode(),
+        )
+    return digest.hexdigest()
+
+
+def _conda_lock_header(
+    env: Environment,
+    platforms: list[LockPlatform],
+    mirrors: _MirrorMap | None = None,
+    package_digest: str | None = None,
+) -> dict[str, Any]:
+    """The conda-lock data of an environment without its package entries.
+
+    The packages of every platform are checked with
+    `_validate_pip_in_platform_packages` first, so an environment that cannot be
+    converted fails before any of its entries are created or written.
+
+    The `custom_metadata` records the sha256 ``package_digest`` of the `package`
+    section (see `_dump_package_section`), so that a check of the header also
+    covers the package entries. It has no converter version, so that an upgrade
+    only rewrites the files whose content changes. Without it, it has
+    a placeholder of the same length, to be replaced once the entries are written.
+    """
+    content_hashes = {}
+    for platform in platforms:
+        packages = env.packages(platform) or []
+        _validate_pip_in_platform_packages(platform, packages)
+        content_hashes[str(platform)] = _content_hash(
+            packages,
+            mirrors,
+            _package_categories(env, platform),
+        )
+    channels = [
+        {
+            "url": _channel_url(str(channel), mirrors),
+            "used_env_vars": [],
+        }
+        for channel in env.channels()
+    ]
+    metadata = _create_conda_lock_metadata(platforms, channels, content_hashes)
+    metadata["custom_metadata"] = {
+        "package_digest": f"sha256:{package_digest or '0' * 64}",
+    }
+    return {"version": 1, "metadata": metadata, "package": []}
+
+
+def _channel_url(url: str, mirrors: _MirrorMap | None = None) -> str:
+    """A channel as listed in conda-lock metadata, by name if on anaconda.org."""
+    if mirrors is not None:
+        url = mirrors.rewrite(url)
+    return url.replace("https://conda.anaconda.org/", "")
+
+
+class _MirrorMap:
+    """Rewrites URLs that start with one of the configured prefixes to a mirror.
+
+    The prefixes are indexed by their length, so rewriting a URL takes one dict
+    lookup per distinct prefix length (longest first, so the most specific prefix
+    wins), no matter how many prefixes there are.
+    """
+
+    def __init__(self, mirrors: Mapping[str, str]) -> None:
+        self.mirrors = dict(mirrors)
+        self._lengths = sorted({len(prefix) for prefix in self.mirrors}, reverse=True)
+
+    def rewrite(self, url: str) -> str:
+        """The URL on its mirror, or unchanged if no prefix matches."""
+        for length in self._lengths:
+            mirror = self.mirrors.get(url[:length])
+            if mirror is not None:
+                return mirror + url[length:]
+        return url
+
+    def fingerprint(self) -> str:
+        """Identifies the mapping (e.g., in the conversion cache)."""
+        return json.dumps(sorted(self.mirrors.items()))
+
+
+def _mirror_map(mirrors: Mapping[str, str] | Iterable[str] | None) -> _MirrorMap | None:
+    """A `_MirrorMap` from a mapping or ``PREFIX=MIRROR`` strings, None if empty.
+
+    Raises:
+        ValueError: If a string is not of the form ``PREFIX=MIRROR``
+
+    """
+    if not mirrors:
+        return None
+    if not isinstance(mirrors, Mapping):
+        pairs = [mirror.split("=", 1) for mirror in mirrors]
+        if any(len(pair) != 2 or not pair[0] for pair in pairs):  # noqa: PLR2004
+            msg = f"Mirrors must be given as PREFIX=MIRROR, got: {mirrors}"
+            raise ValueError(msg)
+        mirrors = dict(pairs)
+    return _MirrorMap(mirrors)
+
+
+def _validate_pip_in_platform_packages(
+    platform: LockPlatform,
+    packages: list[LockedPackage],
+) -> None:
+    """Check a platform's packages before any of its entries are created."""
+    from rattler import CondaLockedPackage, PypiLockedPackage
+
+    has_pypi = any(isinstance(package, PypiLockedPackage) for package in packages)
+    has_pip = any(
+        isinstance(package, CondaLockedPackage) and package.name == "pip"
+        for package in packages
+    )
+    _validate_pip_in_conda_packages({str(platform): has_pypi}, {str(platform): has_pip})
+
+
+def _validate_pip_in_conda_packages(
+    has_pypi_packages: dict[str, bool],
+    has_pip: dict[str, bool],
+) -> None:
+    for platform, has_pypi in has_pypi_packages.items():
+        if has_pypi and not has_pip[platform]:
+            msg = (
+                "❌ PyPI packages are present but no pip package found in conda packages."
+                " Please ensure that pip is included in your pixi.lock file."
+            )
+            raise ValueError(msg)
+
+
+# Lock file parsed once per worker process by `_init_worker`, and the package index
+# shared by all tasks that run in that worker.
+_WORKER_LOCK_FILE: LockFile | None = None
+_WORKER_INDEX: _PackageIndex | None = None
+_WORKER_ONLY: list[str] | None = None
+
+
+def _init_worker(
+    lock_file_path: Path,
+    mirrors: _MirrorMap | None = None,
+    only: list[str] | None = None,
+) -> None:
+    """Parse the lock file once in each worker process."""
+    global _WORKER_LOCK_FILE, _WORKER_INDEX, _WORKER_ONLY
+    _WORKER_LOCK_FILE = _parse_lock_file(lock_file_path, None)
+    _WORKER_INDEX = _PackageIndex(mirrors)
+    _WORKER_ONLY = only
+
+
+def _convert_platform_in_worker(
+    env_name: str,
+    platform_name: str,
+    profile: bool,  # noqa: FBT001
+) -> _PlatformResult:
+    """Convert a single environment and platform inside a worker process."""
+    assert _WORKER_LOCK_FILE is not None
+    env = _get_environment(_WORKER_LOCK_FILE, env_name, _WORKER_ONLY)
+    platform = next(p for p in env.platforms() if str(p) == platform_name)
+    profiler = Profiler() if profile else None
+    result = _convert_platform(env, platform, env_name, profiler, _WORKER_INDEX)
+    if profiler is not None:
+        result = result._replace(profile=profiler.records)
+    return result
+
+
+def _convert_envs_in_parallel(
+    lock_file_path: Path,
+    lock_file: LockFile,
+    env_names: list[str],
+    jobs: int,
+    profiler: Profiler | None = None,
+    index: _PackageIndex | None = None,
+    selected_platforms: Iterable[str | Platform] | None = None,
+    only: list[str] | None = None,
+) -> Iterator[tuple[str, list[list[_PackageEntry]]]]:
+    """Convert environments on a process pool, yielding each as soon as it is done.
+
+    Every (environment, platform) pair is a separate task and the largest tasks are
+    submitted first, so that a big environment does not end up running alone at the
+    end. An environment is yielded with the entries of its platforms (selected as
+    by `_convert_env_to_conda_lock`) in platform order, so writing them gives the
+    same output as a serial conversion. Entries that the workers send back for
+    packages shared by several environments (or already in ``index``) are
+    deduplicated, so they are only kept in memory once.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    envs = {
+        env_name: _get_environment(lock_file, env_name, only) for env_name in env_names
+    }
+    platforms = {
+        env_name: _select_platforms(env, selected_platforms, strict=False)
+        for env_name, env in envs.items()
+    }
+    tasks = [
+        (len(env.packages(platform) or []), env_name, i)
+        for env_name, env in envs.items()
+        for i, platform in enumerate(platforms[env_name])
+    ]
+    tasks.sort(key=lambda task: -task[0])
+    results: dict[str, list[_PlatformResult | None]] = {
+        env_name: [None] * len(platforms[env_name]) for env_name in env_names
+    }
+    remaining = {env_name: len(platforms[env_name]) for env_name in env_names}
+    index = index if index is not None else _PackageIndex()
+    for env_name in env_names:
+        if not remaining[env_name]:
+            yield env_name, []
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(lock_file_path, index.mirrors, only),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _convert_platform_in_worker,
+                env_name,
+                str(platforms[env_name][i]),
+                profiler is not None,
+            ): (env_name, i)
+            for _, env_name, i in tasks
+        }
+        for future in as_completed(futures):
+            env_name, i = futures[future]
+            result = future.result()
+            # The entries are in package order, keyed like in `_PackageIndex`
+            platform = platforms[env_name][i]
+            entries = [
+                index.share(_index_key(package, str(platform)), entry)
+                for package, entry in zip(
+                    envs[env_name].packages(platform) or [],
+                    result.entries,
+                )
+            ]
+            results[env_name][i] = result = result._replace(entries=entries)
+            if profiler is not None and result.profile is not None:
+                profiler.records.extend(result.profile)
+            remaining[env_name] -= 1
+            if remaining[env_name] == 0:
+                yield env_name, [
+                    r.entries for r in results.pop(env_name) if r is not None
+                ]
 
 
 def _parse_args() -> argparse.Namespace:
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="Convert pixi.lock to conda-lock.yml")
     parser.add_argument(
-        "pixi_lock",
+        "pixi_locks",
         type=Path,
-        help="Path to pixi.lock file",
-        default="pixi.lock",
+        nargs="+",
+        metavar="pixi_lock",
+        help="Path to pixi.lock file, or several paths, directories or glob patterns"
+        " (e.g., 'projects/**/pixi.lock') to convert in one batch",
     )
     parser.add_argument(
         "--output",
@@ -281,13 +2044,120 @@ def _parse_args() -> argparse.Namespace:
         "-e",
         help="Specific environment to convert (default: convert all environments)",
     )
+    parser.add_argument(
+        "--platform",
+        "-p",
+        action="append",
+        metavar="PLATFORM",
+        help="Only convert this platform (e.g., linux-64), can be repeated"
+        " (default: all platforms)",
+    )
+    parser.add_argument(
+        "--artifact-cache",
+        type=Path,
+        metavar="DIR",
+        help="Directory with package archives (e.g., a conda pkgs directory or a"
+        " wheelhouse) that are hashed to fill in missing sha256/md5 hashes and to"
+        " verify the hashes in the lock file",
+    )
+    parser.add_argument(
+        "--explicit",
+        action="store_true",
+        help="Also write an @EXPLICIT spec file (conda-<platform>.lock) per"
+        " environment and platform, and a pip requirements file with hashes"
+        " (requirements-<platform>.txt) for the PyPI packages",
+    )
+    parser.add_argument(
+        "--mirror",
+        action="append",
+        metavar="PREFIX=MIRROR",
+        help="Replace the URL prefix PREFIX of packages and channels by MIRROR, e.g.,"
+        " https://conda.anaconda.org/=https://mirror.example.com/conda/, can be"
+        " repeated (the longest matching prefix wins)",
+    )
+    parser.add_argument(
+        "--only",
+        action="extend",
+        nargs="+",
+        metavar="PKG",
+        help="Only write these packages and the packages they (transitively) depend"
+        " on, e.g., for slim runtime images (default: all packages)",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Write all environments to a single conda-lock.yml, with the packages"
+        " that all of them share in the main category and the others as optional,"
+        " in a category named after the environments that have them (e.g., dev+test)",
+    )
+    parser.add_argument(
+        "--split-platforms",
+        action="store_true",
+        help="Write a conda-lock file per environment and platform (e.g.,"
+        " conda-lock.linux-64.yml), each with its own metadata, instead of one per"
+        " environment",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of worker processes used to convert environments and platforms"
+        " in parallel, 0 uses all CPUs (default: 1)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Convert all environments, even those unchanged since the last run",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        metavar="PATH",
+        help="Write the wall time, package count and peak memory of every stage"
+        " (per environment and platform) to a JSON file",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and convert the environments that changed whenever the"
+        " lock file changes",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only check that the conda-lock files are up to date, exit with 1 and"
+        " list the stale environments if not (writes nothing)",
+    )
+    parser.add_argument(
+        "--summary",
+        type=Path,
+        metavar="PATH",
+        help="Where to write the JSON summary (status and timing per lock file) of a"
+        " batch, '-' for stdout (default: stdout)",
+    )
     parser.add_argument(
         "--verbose",
         "-v",
         action="store_true",
         help="Enable verbose logging",
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    args.pixi_lock = args.pixi_locks[0]
+    args.batch = (
+        len(args.pixi_locks) > 1 or _is_glob(args.pixi_lock) or args.pixi_lock.is_dir()
+    )
+    if args.batch and args.watch:
+        parser.error("--watch supports a single lock file")
+    if args.check and (args.batch or args.watch):
+        parser.error("--check supports a single lock file and no --watch")
+    if args.merge and args.explicit:
+        parser.error("--explicit writes the files of each environment, not --merge")
+    try:
+        _mirror_map(args.mirror)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
 
 
 def _prepare_output_directory(output_path: Path | None) -> Path:
@@ -308,11 +2178,464 @@ def _get_output_filename(output_dir: Path, env_name: str) -> Path:
     )
 
 
+def _output_files(
+    output_file: Path,
+    platforms: list[LockPlatform],
+    *,
+    split: bool = False,
+) -> list[tuple[Path, list[LockPlatform]]]:
+    """The conda-lock files of an environment, with the platforms that each contains.
+
+    That is ``output_file`` with all platforms, or with ``split``, a file per
+    platform with the platform before the suffix (e.g., ``conda-lock.linux-64.yml``
+    or ``dev.conda-lock.linux-64.yml``).
+    """
+    if not split:
+        return [(output_file, platforms)]
+    return [
+        (
+            output_file.with_name(f"{output_file.stem}.{platform}{output_file.suffix}"),
+            [platform],
+        )
+        for platform in platforms
+    ]
+
+
+@functools.cache
+def _converter_version() -> str:
+    """The installed version of pixi-to-conda-lock."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("pixi-to-conda-lock")
+    except PackageNotFoundError:  # pragma: no cover
+        return "unknown"
+
+
+def _package_hashes(package: CondaLockedPackage | PypiLockedPackage) -> tuple[str, str]:
+    """The (md5, sha256) hex digests of a locked package, empty when missing."""
+    md5 = sha256 = ""
+    hashes = package.hashes
+    if hashes:
+        with suppress(AttributeError):
+            md5 = hashes.md5.hex() if hashes.md5 else ""
+        with suppress(AttributeError):
+            sha256 = hashes.sha256.hex() if hashes.sha256 else ""
+    return md5, sha256
+
+
+def _package_requirements(package: LockedPackage) -> list[str]:
+    """The requirements of a locked package (``depends`` or ``requires_dist``)."""
+    from rattler import CondaLockedPackage
+
+    if isinstance(package, CondaLockedPackage):
+        record = package.package_record
+        return list(record.depends) if record is not None else []
+    return list(cast("PypiLockedPackage", package).requires_dist or [])
+
+
+def _environment_fingerprint(
+    env: Environment,
+    platforms: Iterable[str | Platform] | None = None,
+) -> str:
+    """A digest of everything in an environment that affects its conda-lock output.
+
+    Covers the channels and, per (selected) platform, every field that the entries
+    of the locked packages are created from: name, version, URL, hashes and
+    requirements. So a package without hashes (e.g., an editable ``pypi: .``) whose
+    requirements change is reconverted too. This is much cheaper than a conversion.
+    """
+    digest = hashlib.sha256()
+    for channel in env.channels():
+        digest.update(f"channel\0{channel}\0".encode())
+    for platform in _select_platforms(env, platforms, strict=False):
+        digest.update(f"platform\0{platform}\0".encode())
+        for locked in env.packages(platform):
+            package = cast("CondaLockedPackage | PypiLockedPackage", locked)
+            md5, sha256 = _package_hashes(package)
+            requirements = "\0".join(_package_requirements(package))
+            digest.update(
+                f"{package.name}\0{package.version}\0{package.location}"
+                f"\0{md5}\0{sha256}\0{requirements}\n".encode(),
+            )
+        categories = _package_categories(env, platform)
+        if categories is not None:
+            digest.update("\0".join(categories).encode())
+    return digest.hexdigest()
+
+
+def _file_digest(path: str | Path) -> str:
+    """The sha256 hex digest of a file."""
+    with open(path, "rb") as f:
+        return _stream_digest(f)
+
+
+def _stream_digest(f: BinaryIO, digest: Any = None) -> str:
+    """The sha256 hex digest of the rest of a binary file, added to digest if given."""
+    digest = digest if digest is not None else hashlib.sha256()
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _converter_stamp() -> str:
+    """Identifies the converter code (cheaper than its version, see `_ConversionCache`)."""
+    stat = Path(__file__).stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+_CACHE_FILENAME = ".pixi-to-conda-lock-cache.json"
+
+
+class _ConversionCache:
+    """Sidecar file in the output directory that records converted environments.
+
+    For every output file it stores the environment and the fingerprint of the
+    environment it was generated from, the digest of the lock file it was read
+    from, the converter that wrote it, and the size and mtime of the written file
+    (so that outputs modified or removed since are regenerated). The converter is
+    identified by the size and mtime of this module instead of by its version, which
+    would require importing `importlib.metadata` on every run.
+
+    It also stores the environments of every lock file, so that an unchanged lock
+    file is recognized without parsing it (or importing rattler).
+    """
+
+    def __init__(self, output_dir: Path) -> None:
+        self.path = output_dir / _CACHE_FILENAME
+        self.converter = _converter_stamp()
+        self.outputs: dict[str, dict[str, Any]] = {}
+        self.lock_files: dict[str, dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                self.outputs = data["outputs"]
+                self.lock_files = data["lock_files"]
+            except (OSError, ValueError, KeyError, TypeError):
+                logging.warning("Ignoring invalid cache file: %s", self.path)
+
+    def is_fresh(self, output_file: Path, **expected: Any) -> bool:
+        """Whether output_file was written by this converter, with the expected values.
+
+        Pass e.g. ``environment``, ``fingerprint``, ``lock_digest`` and/or
+        ``platforms`` (None, the default for all platforms, matches a missing value).
+        """
+        entry = self.outputs.get(output_file.name)
+        if entry is None or not output_file.exists():
+            return False
+        stat = output_file.stat()
+        return (
+            entry.get("converter") == self.converter
+            and entry.get("size") == stat.st_size
+            and entry.get("mtime_ns") == stat.st_mtime_ns
+            and all(entry.get(key) == value for key, value in expected.items())
+        )
+
+    def update(self, output_file: Path, **values: Any) -> None:
+        """Record that output_file was written, with values as for `is_fresh`."""
+        stat = output_file.stat()
+        self.outputs[output_file.name] = {
+            **values,
+            "converter": self.converter,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    def all_fresh(self, output_files: Iterable[Path], **expected: Any) -> bool:
+        """Whether all the output files are fresh (see `is_fresh`)."""
+        return all(self.is_fresh(file_path, **expected) for file_path in output_files)
+
+    def update_all(self, output_files: Iterable[Path], **values: Any) -> None:
+        """Record that all the output files were written (see `update`)."""
+        for file_path in output_files:
+            self.update(file_path, **values)
+
+    def recorded_outputs(self, output_dir: Path, **values: Any) -> list[Path]:
+        """The recorded output files with the given values (as for `is_fresh`)."""
+        return [
+            output_dir / name
+            for name, entry in self.outputs.items()
+            if all(entry.get(key) == value for key, value in values.items())
+        ]
+
+    def environments(self, lock_file_path: Path, lock_digest: str) -> list[str] | None:
+        """The environments of a lock file, None if it changed since it was recorded."""
+        entry = self.lock_files.get(str(Path(lock_file_path).resolve()))
+        if entry is None or entry.get("digest") != lock_digest:
+            return None
+        return entry["environments"]
+
+    def record_environments(
+        self,
+        lock_file_path: Path,
+        lock_digest: str,
+        env_names: list[str],
+    ) -> None:
+        """Record the environments of a lock file."""
+        self.lock_files[str(Path(lock_file_path).resolve())] = {
+            "digest": lock_digest,
+            "environments": env_names,
+        }
+
+    def save(self) -> None:
+        """Write the cache file."""
+        with open(self.path, "w") as f:
+            json.dump(
+                {"outputs": self.outputs, "lock_files": self.lock_files},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+
+def _cache_options(
+    platforms: list[str] | None,
+    artifacts: _ArtifactHashes | None,
+    *,
+    explicit: bool = False,
+    split: bool = False,
+    mirrors: _MirrorMap | None = None,
+    only: list[str] | None = None,
+    merge: bool = False,
+) -> dict[str, Any]:
+    """Conversion options that the cached outputs must match, besides the input.
+
+    Options at their default are None, which matches caches written before the
+    option existed.
+    """
+    return {
+        "platforms": platforms,
+        "artifacts": artifacts.fingerprint() if artifacts is not None else None,
+        "explicit": True if explicit else None,
+        "split": True if split else None,
+        "mirrors": mirrors.fingerprint() if mirrors is not None else None,
+        "only": only,
+        "merge": True if merge else None,
+    }
+
+
+_ARTIFACT_SUFFIXES = (".conda", ".tar.bz2", ".whl", ".tar.gz", ".zip")
+
+
+class _ArtifactHashes:
+    """The md5 and sha256 hashes of the package archives in a local directory.
+
+    The directory is, e.g., a conda pkgs directory or a wheelhouse, in which the
+    archives have the file names of their URLs. Archives are only hashed when
+    their hashes are requested, in parallel threads (hashlib releases the GIL)
+    reading memory-mapped files. The hashes are cached in a file per directory in
+    the user cache directory (see `_user_cache_dir`), keyed by file name, size and
+    mtime, so that later runs do not hash them again. `n_mismatches` counts the
+    entries with a hash that does not match their archive (see `check`).
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        key = hashlib.sha256(str(directory.resolve()).encode()).hexdigest()[:16]
+        self.cache_path = _user_cache_dir() / f"hashes-{key}.json"
+        self.n_mismatches = 0
+        self.files = {
+            entry.name: entry.stat()
+            for entry in os.scandir(directory)
+            if entry.name.endswith(_ARTIFACT_SUFFIXES) and entry.is_file()
+        }
+        self.cached: dict[str, dict[str, Any]] = {}
+        if self.cache_path.exists():
+            try:
+                with open(self.cache_path) as f:
+                    self.cached = json.load(f)
+            except (OSError, ValueError):
+                logging.warning("Ignoring invalid hash cache: %s", self.cache_path)
+
+    def fingerprint(self) -> str:
+        """A digest of the names, sizes and mtimes of the archives."""
+        digest = hashlib.sha256()
+        for name, stat_result in sorted(self.files.items()):
+            digest.update(
+                f"{name}\0{stat_result.st_size}\0{stat_result.st_mtime_ns}\0".encode(),
+            )
+        return digest.hexdigest()
+
+    def hashes(self, names: Iterable[str]) -> dict[str, tuple[str, str]]:
+        """The (md5, sha256) hex digests of the archives with the given names."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        result: dict[str, tuple[str, str]] = {}
+        missing = []
+        for name in names:
+            stat_result = self.files[name]
+            cached = self.cached.get(name)
+            if (
+                cached is not None
+                and cached.get("size") == stat_result.st_size
+                and cached.get("mtime_ns") == stat_result.st_mtime_ns
+            ):
+                result[name] = (cached["md5"], cached["sha256"])
+            else:
+                missing.append(name)
+        if not missing:
+            return result
+        logging.info("Hashing %d package archives", len(missing))
+        paths = [self.directory / name for name in missing]
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for name, hashes in zip(missing, executor.map(_hash_artifact, paths)):
+                result[name] = hashes
+                self.cached[name] = {
+                    "size": self.files[name].st_size,
+                    "mtime_ns": self.files[name].st_mtime_ns,
+                    "md5": hashes[0],
+                    "sha256": hashes[1],
+                }
+        self.save()
+        return result
+
+    def save(self) -> None:
+        """Write the hash cache, if the cache directory is writable."""
+        tmp_path = self.cache_path.with_name(f".{self.cache_path.name}.{os.getpid()}")
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(self.cached, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logging.debug("Could not write the hash cache %s: %s", self.cache_path, e)
+            with suppress(OSError):
+                tmp_path.unlink()
+
+    def check(self) -> None:
+        """Raise a ValueError if any hash in the lock file did not match its archive."""
+        if self.n_mismatches:
+            msg = (
+                f"{self.n_mismatches} package hash(es) in the lock file do not match"
+                f" the archives in {self.directory}"
+            )
+            raise ValueError(msg)
+
+
+def _user_cache_dir() -> Path:
+    """The directory for caches of the user, e.g., ``~/.cache/pixi-to-conda-lock``."""
+    if os.environ.get("XDG_CACHE_HOME"):
+        base = Path(os.environ["XDG_CACHE_HOME"])
+    elif sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path.home() / ".cache"
+    return base / "pixi-to-conda-lock"
+
+
+def _hash_artifact(path: Path) -> tuple[str, str]:
+    """The (md5, sha256) hex digests of a file, read memory-mapped."""
+    import mmap
+
+    md5 = hashlib.md5()  # noqa: S324
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:  # empty files cannot be mapped
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                md5.update(data)
+                sha256.update(data)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+def _artifact_filename(url: str) -> str:
+    """The file name of a package archive, the last component of its URL."""
+    return unquote(urlsplit(url).path.rsplit("/", 1)[-1])
+
+
+def _apply_artifact_hashes(
+    entries: list[_PackageEntry],
+    artifacts: _ArtifactHashes,
+    profiler: Profiler | None = None,
+) -> int:
+    """Fill in missing hashes of entries from local archives and verify the others.
+
+    Conda entries get an md5 and sha256, pip entries (like in conda-lock) only a
+    sha256. A hash in the lock file that does not match the archive is kept, and
+    reported as an error (and counted in ``artifacts.n_mismatches``). The entries
+    are shared (see `_PackageIndex`), so those with an archive are replaced by
+    copies in ``entries``, which keeps the hashes from the lock file in the
+    shared ones.
+
+    Returns:
+        The number of entries with a hash that does not match the archive
+
+    """
+    with _profile_stage(profiler, "artifacts") as record:
+        by_name: dict[str, list[int]] = {}
+        for i, entry in enumerate(entries):
+            name = _artifact_filename(entry.url)
+            if name in artifacts.files:
+                by_name.setdefault(name, []).append(i)
+        record["packages"] = len(by_name)
+        n_mismatches = 0
+        for name, (md5, sha256) in artifacts.hashes(by_name).items():
+            for i in by_name[name]:
+                entry = entries[i] = copy.copy(entries[i])
+                if entry.manager == "conda":
+                    entry.md5 = entry.md5 or md5
+                entry.sha256 = entry.sha256 or sha256
+                if (entry.manager == "conda" and entry.md5 != md5) or (
+                    entry.sha256 != sha256
+                ):
+                    n_mismatches += 1
+                    logging.error(
+                        "Hash mismatch for %s: the lock file does not match %s",
+                        entry.url,
+                        artifacts.directory / name,
+                    )
+    artifacts.n_mismatches += n_mismatches
+    return n_mismatches
+
+
+def _is_unchanged(
+    cache: _ConversionCache,
+    lock_file_path: Path,
+    lock_digest: str,
+    environment: str | None,
+    output_dir: Path,
+    **options: Any,
+) -> bool:
+    """Whether all requested outputs are up to date, decided without parsing the lock.
+
+    Besides the conda-lock file of every environment, the other files recorded for
+    it with the same options (e.g., per platform or explicit files) must also exist
+    unchanged.
+    """
+    env_names = cache.environments(lock_file_path, lock_digest)
+    if env_names is None or (environment is not None and environment not in env_names):
+        return False
+    return all(
+        cache.all_fresh(
+            [
+                _get_output_filename(output_dir, env_name),
+                *cache.recorded_outputs(
+                    output_dir,
+                    environment=env_name,
+                    lock_digest=lock_digest,
+                    **options,
+                ),
+            ],
+            environment=env_name,
+            lock_digest=lock_digest,
+            **options,
+        )
+        for env_name in ([environment] if environment else env_names)
+    )
+
+
 def main() -> int:
     """Main function to convert pixi.lock to conda-lock.yml."""
+    if sys.argv[1:2] == ["serve"]:
+        return _main_serve(sys.argv[2:])
     args = _parse_args()
     _setup_logging(args.verbose)
 
+    if args.batch:
+        return _main_batch(args)
+
     logging.info("Starting pixi.lock to conda-lock.yml conversion")
     logging.info("Input file: %s", args.pixi_lock)
 
@@ -320,33 +2643,994 @@ def main() -> int:
         logging.error("Error: %s does not exist", args.pixi_lock)
         return 1
 
+    if args.check:
+        return _main_check(args)
+
     # Determine output directory
     output_dir = _prepare_output_directory(args.output)
 
+    profiler = Profiler() if args.profile else None
+    try:
+        if args.watch:
+            _watch(args, output_dir, profiler)
+        else:
+            _convert_lock_file(args, output_dir, profiler)
+    except KeyboardInterrupt:
+        logging.info("Stopped watching %s", args.pixi_lock)
+    except Exception:
+        logging.exception("Error during conversion")
+        return 1
+    finally:
+        if profiler is not None:
+            profiler.write_json(args.profile)
+            logging.info("Wrote profile to %s", args.profile)
+
+    return 0
+
+
+def _main_batch(args: argparse.Namespace) -> int:
+    """Convert many lock files in one run and write a JSON summary."""
+    start = time.perf_counter()
+    lock_files = _expand_lock_files(args.pixi_locks)
+    logging.info("Converting %d lock files", len(lock_files))
+    profiler = Profiler() if args.profile else None
+    jobs = args.jobs or os.cpu_count() or 1
+    try:
+        summaries = _convert_batch(args, lock_files, jobs, profiler)
+    finally:
+        if profiler is not None:
+            profiler.write_json(args.profile)
+            logging.info("Wrote profile to %s", args.profile)
+    n_failed = sum(summary["status"] == "failed" for summary in summaries)
+    summary = {
+        "lock_files": summaries,
+        "n_failed": n_failed,
+        "seconds": time.perf_counter() - start,
+    }
+    text = json.dumps(summary, indent=2) + "\n"
+    if args.summary is None or str(args.summary) == "-":
+        sys.stdout.write(text)
+    else:
+        args.summary.write_text(text)
+        logging.info("Wrote summary to %s", args.summary)
+    return 1 if n_failed or not lock_files else 0
+
+
+def _main_check(args: argparse.Namespace) -> int:
+    """Check that the conda-lock files are up to date, without writing anything."""
+    output_dir = args.output if args.output else Path(".")
     try:
-        lock_file = LockFile.from_path(args.pixi_lock)
-        env_names = (
-            [args.environment]
-            if args.environment
-            else [name for name, _ in lock_file.environments()]
+        stale = _stale_environments(args, output_dir)
+    except Exception:
+        logging.exception("Error during check")
+        return 1
+    if stale:
+        logging.error(
+            "Stale conda-lock files (run pixi-to-conda-lock to update them): %s",
+            ", ".join(stale),
         )
+        return 1
+    logging.info("All conda-lock files are up to date")
+    return 0
+
+
+def _stale_environments(args: argparse.Namespace, output_dir: Path) -> list[str]:
+    """The environments whose conda-lock files differ from what a conversion writes.
+
+    An output is decided on from its header when possible: its metadata (the
+    channels, platforms and per-platform `content_hash` fingerprints of the locked
+    packages) is compared to that of the lock file, without creating any package
+    entries (see `_has_current_header`). Only when that is inconclusive (the
+    header cannot be read, or ``--artifact-cache`` or ``--explicit`` also affect
+    the outputs) is the environment converted, with a dry-run write that compares
+    the result to the existing files.
+    """
+    selection = _platform_selection(args.platform)
+    artifacts = _ArtifactHashes(args.artifact_cache) if args.artifact_cache else None
+    lock_file = _parse_lock_file(args.pixi_lock, None)
+    env_names = (
+        [args.environment]
+        if args.environment
+        else [name for name, _ in lock_file.environments()]
+    )
+    env_names = _environments_with_platforms(
+        lock_file,
+        env_names,
+        selection,
+        strict=args.environment is not None,
+    )
+    mirrors = _mirror_map(args.mirror)
+    only = _package_selection(args.only)
+    index = _PackageIndex(mirrors)
+    stale = []
+    envs = _selected_environments(lock_file, env_names, only, merge=args.merge)
+    for env_name, env in envs.items():
+        platforms = _select_platforms(env, selection, strict=False)
+        output_file = _get_output_filename(output_dir, env_name)
+        if artifacts is None and not args.explicit:
+            current = [
+                _has_current_header(file_path, env, file_platforms, mirrors)
+                for file_path, file_platforms in _output_files(
+                    output_file,
+                    platforms,
+                    split=args.split_platforms,
+                )
+            ]
+            if False in current:
+                stale.append(env_name)
+                continue
+            if None not in current:
+                continue
+            logging.debug("Cannot decide on %s from the headers", env_name)
+        if _write_environment(
+            output_file,
+            env,
+            env_name,
+            platforms,
+            _iter_platform_entries(env, platforms, env_name, None, index),
+            None,
+            artifacts,
+            args.explicit,
+            split=args.split_platforms,
+            mirrors=mirrors,
+            dry_run=True,
+        ):
+            stale.append(env_name)
+    if artifacts is not None:
+        artifacts.check()
+    stale.sort()
+    for env_name in stale:
+        logging.error("Environment '%s' is stale", env_name)
+    return stale
 
-        for env_name in env_names:
-            conda_lock_data = _convert_env_to_conda_lock(lock_file, env_name)
+
+def _has_current_header(
+    output_file: Path,
+    env: Environment,
+    platforms: list[LockPlatform],
+    mirrors: _MirrorMap | None = None,
+) -> bool | None:
+    """Whether a conda-lock file has the header a conversion would write.
+
+    Only the header (everything before `package`) is parsed, the rest of the file
+    is hashed: the `package_digest` in the header must be its digest, so that
+    modified package entries are detected too (see `_conda_lock_header`). None if
+    that is inconclusive: the file has no header that can be parsed.
+    """
+    import yaml
+
+    lines = []
+    digest = hashlib.sha256()
+    try:
+        with open(output_file, "rb") as f:
+            for line in f:
+                if line.startswith(b"package:"):
+                    digest.update(line)
+                    break
+                lines.append(line)
+            else:
+                return None
+            _stream_digest(f, digest)
+    except FileNotFoundError:
+        return False
+    try:
+        header = yaml.safe_load(b"".join(lines))
+    except yaml.YAMLError:
+        return None
+    if not isinstance(header, dict) or "metadata" not in header:
+        return None
+    expected = _conda_lock_header(env, platforms, mirrors, digest.hexdigest())
+    return (
+        header.get("version") == expected["version"]
+        and header["metadata"] == expected["metadata"]
+    )
+
+
+def _is_glob(path: Path) -> bool:
+    """Whether a path is a glob pattern."""
+    return any(char in str(path) for char in "*?[")
+
+
+def _expand_lock_files(patterns: list[Path]) -> list[Path]:
+    """The lock files matching paths, directories (their pixi.lock) and globs."""
+    import glob
+
+    lock_files: list[Path] = []
+    for pattern in patterns:
+        if _is_glob(pattern):
+            matches = sorted(glob.glob(str(pattern), recursive=True))
+            if not matches:
+                logging.warning("No lock files match %s", pattern)
+            lock_files.extend(Path(match) for match in matches)
+        elif pattern.is_dir():
+            lock_files.append(pattern / "pixi.lock")
+        else:
+            lock_files.append(pattern)
+    return list(dict.fromkeys(lock_files))
+
+
+def _batch_output_dirs(
+    lock_files: list[Path],
+    output: Path | None,
+) -> dict[Path, Path]:
+    """The output directory of every lock file in a batch.
+
+    The conda-lock files are written next to each lock file, or, with ``--output``,
+    to the same relative location inside the output directory.
+    """
+    if output is None:
+        return {lock_file: lock_file.parent for lock_file in lock_files}
+    parents = [lock_file.resolve().parent for lock_file in lock_files]
+    root = Path(os.path.commonpath(parents)) if parents else Path()
+    return {
+        lock_file: output / parent.relative_to(root)
+        for lock_file, parent in zip(lock_files, parents)
+    }
+
+
+def _convert_batch(
+    args: argparse.Namespace,
+    lock_files: list[Path],
+    jobs: int,
+    profiler: Profiler | None,
+) -> list[dict[str, Any]]:
+    """Convert many lock files, on a process pool if ``jobs > 1``.
+
+    Every process converts whole lock files with a package index that it shares
+    between them, so entries of packages with the same URL in several lock files
+    (e.g., of the projects in a monorepo) are only built once per process.
+    """
+    output_dirs = _batch_output_dirs(lock_files, args.output)
+    if jobs == 1 or len(lock_files) == 1:
+        index = _PackageIndex(_mirror_map(args.mirror))
+        return [
+            _convert_batch_item(
+                args,
+                lock_file,
+                output_dirs[lock_file],
+                profiler,
+                index,
+            )
+            for lock_file in lock_files
+        ]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(lock_files)),
+        initializer=_init_batch_worker,
+        initargs=(_mirror_map(args.mirror),),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _convert_batch_item_in_worker,
+                args,
+                lock_file,
+                output_dirs[lock_file],
+                profiler is not None,
+            )
+            for lock_file in lock_files
+        ]
+        summaries = []
+        for future in futures:
+            summary, records = future.result()
+            if profiler is not None:
+                profiler.records.extend(records)
+            summaries.append(summary)
+    return summaries
+
+
+def _init_batch_worker(mirrors: _MirrorMap | None) -> None:
+    """Create the package index that a worker shares between lock files."""
+    global _WORKER_INDEX
+    _WORKER_INDEX = _PackageIndex(mirrors)
+
+
+def _convert_batch_item_in_worker(
+    args: argparse.Namespace,
+    lock_file: Path,
+    output_dir: Path,
+    profile: bool,  # noqa: FBT001
+) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """Convert a lock file of a batch inside a worker process."""
+    profiler = Profiler() if profile else None
+    summary = _convert_batch_item(args, lock_file, output_dir, profiler, _WORKER_INDEX)
+    return summary, profiler.records if profiler is not None else []
+
+
+def _convert_batch_item(
+    args: argparse.Namespace,
+    lock_file: Path,
+    output_dir: Path,
+    profiler: Profiler | None,
+    index: _PackageIndex | None,
+) -> dict[str, Any]:
+    """Convert a lock file of a batch (serially) and summarize the result."""
+    start = time.perf_counter()
+    summary: dict[str, Any] = {
+        "lock_file": str(lock_file),
+        "output_dir": str(output_dir),
+    }
+    item_args = argparse.Namespace(**{**vars(args), "pixi_lock": lock_file, "jobs": 1})
+    try:
+        if not lock_file.exists():
+            msg = f"{lock_file} does not exist"
+            raise FileNotFoundError(msg)  # noqa: TRY301
+        output_dir.mkdir(parents=True, exist_ok=True)
+        converted = _convert_lock_file(item_args, output_dir, profiler, index)
+    except Exception as e:
+        logging.exception("Error converting %s", lock_file)
+        summary.update(status="failed", environments=[], error=str(e))
+    else:
+        status = "converted" if converted else "unchanged"
+        summary.update(status=status, environments=sorted(converted), error=None)
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def _convert_lock_file(
+    args: argparse.Namespace,
+    output_dir: Path,
+    profiler: Profiler | None,
+    index: _PackageIndex | None = None,
+    converted: dict[str, str] | None = None,
+) -> list[str]:
+    """Convert the environments of the lock file as specified on the command line.
+
+    Args:
+        args: The parsed command line arguments
+        output_dir: The directory to write the conda-lock files to
+        profiler: Records the timings of the stages, if not None
+        index: Package index to reuse, e.g., from an earlier conversion
+        converted: Fingerprints of the environments converted earlier in this
+            process (updated in place), which are skipped if they are unchanged
+
+    Returns:
+        The names of the environments that were converted
+
+    """
+    selection = _platform_selection(args.platform)
+    artifacts = _ArtifactHashes(args.artifact_cache) if args.artifact_cache else None
+    mirrors = _mirror_map(args.mirror)
+    only = _package_selection(args.only)
+    options = _cache_options(
+        selection,
+        artifacts,
+        explicit=args.explicit,
+        split=args.split_platforms,
+        mirrors=mirrors,
+        only=only,
+        merge=args.merge,
+    )
+    cache = None if args.no_cache else _ConversionCache(output_dir)
+    lock_digest = _file_digest(args.pixi_lock) if cache is not None else ""
+    if cache is not None and _is_unchanged(
+        cache,
+        args.pixi_lock,
+        lock_digest,
+        args.environment,
+        output_dir,
+        **options,
+    ):
+        logging.info("%s is unchanged, nothing to convert", args.pixi_lock)
+        return []
+
+    lock_file = _parse_lock_file(args.pixi_lock, profiler)
+    all_env_names = [name for name, _ in lock_file.environments()]
+    env_names = [args.environment] if args.environment else list(all_env_names)
+    env_names = _environments_with_platforms(
+        lock_file,
+        env_names,
+        selection,
+        strict=args.environment is not None,
+    )
+
+    envs = _selected_environments(lock_file, env_names, only, merge=args.merge)
+    env_names = list(envs)
+
+    fingerprints: dict[str, str] = {}
+    if cache is not None or converted is not None:
+        if cache is not None:
+            cache.record_environments(args.pixi_lock, lock_digest, all_env_names)
+        for env_name in list(env_names):
+            env = envs[env_name]
+            fingerprints[env_name] = _environment_fingerprint(env, selection)
+            output_files = _environment_outputs(
+                output_dir,
+                env_name,
+                env,
+                _select_platforms(env, selection, strict=False),
+                split=args.split_platforms,
+                explicit=args.explicit,
+            )
+            if not _is_converted(
+                output_files,
+                env_name,
+                fingerprints[env_name],
+                converted,
+            ) and (
+                cache is None
+                or not cache.all_fresh(
+                    output_files,
+                    environment=env_name,
+                    fingerprint=fingerprints[env_name],
+                    **options,
+                )
+            ):
+                continue
+            logging.info("Environment '%s' is unchanged, skipping", env_name)
+            env_names.remove(env_name)
+            _record_converted(
+                cache,
+                converted,
+                output_files,
+                env_name,
+                fingerprints[env_name],
+                lock_digest=lock_digest,
+                **options,
+            )
+
+    # The workers convert the environments of the lock file, not a merged one
+    jobs = 1 if args.merge else args.jobs or os.cpu_count() or 1
+    index = (
+        index
+        if index is not None
+        else _planned_index(
+            [envs[env_name] for env_name in env_names],
+            selection,
+            mirrors,
+        )
+    )
+    conversions = (
+        _convert_envs_in_parallel(
+            args.pixi_lock,
+            lock_file,
+            env_names,
+            jobs,
+            profiler,
+            index,
+            selection,
+            only,
+        )
+        if jobs > 1
+        else _convert_envs_lazily(
+            {env_name: envs[env_name] for env_name in env_names},
+            profiler,
+            index,
+            selection,
+        )
+    )
+    written = []
+    try:
+        for env_name, platform_entries in conversions:
+            env = envs[env_name]
+            platforms = _select_platforms(env, selection, strict=False)
             output_file = _get_output_filename(output_dir, env_name)
-            _write_yaml_file(output_file, conda_lock_data)
+            n_mismatches = artifacts.n_mismatches if artifacts is not None else 0
+            _write_environment(
+                output_file,
+                env,
+                env_name,
+                platforms,
+                platform_entries,
+                profiler,
+                artifacts,
+                args.explicit,
+                split=args.split_platforms,
+                mirrors=mirrors,
+            )
+            written.append(env_name)
             logging.info(
                 "Successfully converted environment '%s' to %s",
                 env_name,
                 output_file,
             )
+            if artifacts is not None and artifacts.n_mismatches > n_mismatches:
+                continue  # not recorded, so that the next run fails too
+            _record_converted(
+                cache,
+                converted,
+                _environment_outputs(
+                    output_dir,
+                    env_name,
+                    env,
+                    platforms,
+                    split=args.split_platforms,
+                    explicit=args.explicit,
+                ),
+                env_name,
+                fingerprints.get(env_name, ""),
+                lock_digest=lock_digest,
+                **options,
+            )
+    finally:
+        if cache is not None:
+            cache.save()
+    if artifacts is not None:
+        artifacts.check()
+    return written
 
-    except Exception:
-        logging.exception("Error during conversion")
-        return 1
 
+def _convert_envs_lazily(
+    envs: dict[str, Environment],
+    profiler: Profiler | None,
+    index: _PackageIndex,
+    selected_platforms: Iterable[str | Platform] | None,
+) -> Iterator[tuple[str, Iterator[list[_PackageEntry]]]]:
+    """Like `_convert_envs_in_parallel`, but the platforms are converted on demand.
+
+    Every platform is only converted when its entries are requested (while writing
+    the previous ones), so only a single platform's entries are held at once.
+    """
+    for env_name, env in envs.items():
+        logging.info("Converting pixi lock file to conda-lock format for %s", env_name)
+        platforms = _select_platforms(env, selected_platforms, strict=False)
+        yield env_name, _iter_platform_entries(
+            env,
+            platforms,
+            env_name,
+            profiler,
+            index,
+        )
+
+
+def _selected_environments(
+    lock_file: LockFile,
+    env_names: list[str],
+    only: list[str] | None,
+    *,
+    merge: bool = False,
+) -> dict[str, Environment]:
+    """The environments to convert by name, with ``merge`` one `_MergedEnvironment`.
+
+    The merged environment is written to the output file of ``default``.
+    """
+    envs = {
+        env_name: _get_environment(lock_file, env_name, only) for env_name in env_names
+    }
+    if merge and envs:
+        return {"default": cast("Environment", _MergedEnvironment(envs))}
+    return envs
+
+
+def _environments_with_platforms(
+    lock_file: LockFile,
+    env_names: list[str],
+    platforms: list[str] | None,
+    *,
+    strict: bool,
+) -> list[str]:
+    """The environments that have any of the platforms (None for all platforms).
+
+    With ``strict``, raise a ValueError if an environment lacks any of them.
+    """
+    if platforms is None:
+        return env_names
+    selected = []
+    for env_name in env_names:
+        env = _get_environment(lock_file, env_name)
+        if _select_platforms(env, platforms, strict=strict):
+            selected.append(env_name)
+        else:
+            logging.info(
+                "Environment '%s' has none of the platforms %s, skipping",
+                env_name,
+                ", ".join(platforms),
+            )
+    return selected
+
+
+def _environment_outputs(
+    output_dir: Path,
+    env_name: str,
+    env: Environment,
+    platforms: list[LockPlatform],
+    *,
+    split: bool,
+    explicit: bool,
+) -> list[Path]:
+    """The files that the conversion of an environment writes.
+
+    With ``explicit``, these include the `_ExplicitFiles` of the platforms, which
+    only exist for the package managers that the platform has packages of.
+    """
+    from rattler import CondaLockedPackage, PypiLockedPackage
+
+    output_files = [
+        file_path
+        for file_path, _ in _output_files(
+            _get_output_filename(output_dir, env_name),
+            platforms,
+            split=split,
+        )
+    ]
+    if explicit:
+        for platform in platforms:
+            packages = env.packages(platform) or []
+            conda_file, pip_file = _get_explicit_filenames(
+                output_dir,
+                env_name,
+                str(platform),
+            )
+            if any(isinstance(package, CondaLockedPackage) for package in packages):
+                output_files.append(conda_file)
+            if any(isinstance(package, PypiLockedPackage) for package in packages):
+                output_files.append(pip_file)
+    return output_files
+
+
+def _record_converted(
+    cache: _ConversionCache | None,
+    converted: dict[str, str] | None,
+    output_files: list[Path],
+    env_name: str,
+    fingerprint: str,
+    **values: Any,
+) -> None:
+    """Record in the cache and in converted that an environment is up to date."""
+    if cache is not None:
+        cache.update_all(
+            output_files,
+            environment=env_name,
+            fingerprint=fingerprint,
+            **values,
+        )
+    if converted is not None:
+        converted[env_name] = fingerprint
+
+
+def _is_converted(
+    output_files: list[Path],
+    env_name: str,
+    fingerprint: str,
+    converted: dict[str, str] | None,
+) -> bool:
+    """Whether this process already wrote the environment to the output files."""
+    return (
+        converted is not None
+        and converted.get(env_name) == fingerprint
+        and all(file_path.exists() for file_path in output_files)
+    )
+
+
+# Seconds between checks of the lock file and that it must be unchanged before
+# converting it in `--watch` mode
+_WATCH_INTERVAL = 0.2
+_WATCH_DEBOUNCE = 0.5
+
+
+def _lock_file_signature(path: Path) -> tuple[int, int] | None:
+    """The modification time and size of a file, None if it does not exist."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _watch(
+    args: argparse.Namespace,
+    output_dir: Path,
+    profiler: Profiler | None,
+    *,
+    interval: float = _WATCH_INTERVAL,
+    debounce: float = _WATCH_DEBOUNCE,
+    max_conversions: int | None = None,
+) -> None:
+    """Convert the lock file, then again every time it changes, until interrupted.
+
+    A change is only converted once the lock file has been unchanged for
+    ``debounce`` seconds, so a burst of writes (e.g., several `pixi add` calls)
+    results in a single conversion. The package index and the fingerprints of
+    the converted environments stay in memory, so only the environments that
+    changed are converted again, reusing the entries of the packages they share
+    with earlier versions of the lock file.
+
+    Args:
+        args: The parsed command line arguments
+        output_dir: The directory to write the conda-lock files to
+        profiler: Records the timings of the stages, if not None
+        interval: Seconds between checks of the lock file
+        debounce: Seconds the lock file must be unchanged before converting it
+        max_conversions: Stop after this many conversions (None to never stop)
+
+    """
+    index = _PackageIndex(_mirror_map(args.mirror))
+    converted: dict[str, str] = {}
+    n_conversions = 0
+    last_converted = None
+    pending = _lock_file_signature(args.pixi_lock)
+    changed_at = time.monotonic() - debounce  # convert right away at the start
+    logging.info("Watching %s for changes (press Ctrl+C to stop)", args.pixi_lock)
+    while max_conversions is None or n_conversions < max_conversions:
+        signature = _lock_file_signature(args.pixi_lock)
+        now = time.monotonic()
+        if signature != pending:
+            pending, changed_at = signature, now
+        if (
+            pending is not None
+            and pending != last_converted
+            and now - changed_at >= debounce
+        ):
+            try:
+                _convert_lock_file(args, output_dir, profiler, index, converted)
+            except Exception:
+                logging.exception("Error during conversion, waiting for changes")
+            last_converted = pending
+            n_conversions += 1
+            continue
+        time.sleep(interval)
+
+
+# Default address and result cache size (bytes of conda-lock YAML) of `serve`
+_SERVE_HOST = "127.0.0.1"
+_SERVE_PORT = 8765
+_SERVE_CACHE_SIZE = 256 << 20
+
+
+def _parse_serve_args(argv: list[str]) -> argparse.Namespace:
+    """Parse the command line arguments of `pixi-to-conda-lock serve`."""
+    parser = argparse.ArgumentParser(
+        prog="pixi-to-conda-lock serve",
+        description="Serve conversions over HTTP: POST a pixi.lock to"
+        " /convert?environment=NAME[&platform=PLATFORM...] to get its conda-lock.yml,"
+        " GET /stats for the cache and latency counters",
+    )
+    parser.add_argument(
+        "--host",
+        default=_SERVE_HOST,
+        help=f"Address to listen on (default: {_SERVE_HOST})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=_SERVE_PORT,
+        help=f"Port to listen on (default: {_SERVE_PORT})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=_SERVE_CACHE_SIZE,
+        metavar="BYTES",
+        help="Maximum total size of the cached conda-lock files, the least recently"
+        f" used are evicted first (default: {_SERVE_CACHE_SIZE})",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Enable verbose logging",
+    )
+    return parser.parse_args(argv)
+
+
+def _main_serve(argv: list[str]) -> int:
+    """Run the conversion service until interrupted."""
+    args = _parse_serve_args(argv)
+    _setup_logging(args.verbose)
+    server = _make_server(args.host, args.port, _ResultCache(args.cache_size))
+    host, port = server.server_address[:2]
+    logging.info(
+        "Serving conversions on http://%s:%d (press Ctrl+C to stop)",
+        host,
+        port,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopped serving")
+    finally:
+        server.server_close()
     return 0
 
 
+class _ResultCache:
+    """A thread-safe LRU cache of conversion results, bounded by their total size.
+
+    Results are keyed by `_request_key`, a digest of the lock file contents and the
+    requested environment and platforms. Once the results take more than
+    ``max_bytes``, the least recently used ones are evicted, and a result larger
+    than ``max_bytes`` is not cached at all.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        import threading
+
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self._results: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        """The cached result, None (and counted as a miss) if there is none."""
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: bytes) -> None:
+        """Cache a result, evicting the least recently used ones to make room."""
+        if len(result) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._results.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._results[key] = result
+            self.size += len(result)
+            while self.size > self.max_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        """The hit, miss and eviction counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._results),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class _LatencyStats:
+    """Thread-safe counters of the requests to a `serve` endpoint and their latency."""
+
+    def __init__(self) -> None:
+        import threading
+
+        self.requests = self.errors = 0
+        self.total_seconds = self.max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, *, error: bool) -> None:
+        """Count a request that took ``seconds``."""
+        with self._lock:
+            self.requests += 1
+            self.errors += error
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def stats(self) -> dict[str, float]:
+        """The request and error counts and the mean and max latency in seconds."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "mean_seconds": (
+                    self.total_seconds / self.requests if self.requests else 0.0
+                ),
+                "max_seconds": self.max_seconds,
+            }
+
+
+def _request_key(body: bytes, environment: str, platforms: list[str] | None) -> str:
+    """The cache key of a conversion request: a digest of everything it depends on."""
+    digest = hashlib.sha256(f"{environment}\0{platforms}\0".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _convert_request(body: bytes, query: str, cache: _ResultCache) -> bytes:
+    """The conda-lock YAML for a `/convert` request, from the cache if possible.
+
+    Args:
+        body: The contents of the pixi.lock file
+        query: The query string, with the ``environment`` (default: 'default') and
+            any number of ``platform`` parameters (default: all platforms)
+        cache: The cache of earlier results
+
+    Raises:
+        ValueError: If the lock file is invalid or lacks the environment or any of
+            the platforms
+
+    """
+    params = parse_qs(query)
+    environment = params.get("environment", ["default"])[-1]
+    platforms = _platform_selection(params.get("platform"))
+    key = _request_key(body, environment, platforms)
+    result = cache.get(key)
+    if result is not None:
+        return result
+    try:
+        lock_file = _load_lock_file(body)
+    except Exception as e:
+        msg = f"Invalid pixi.lock file: {e}"
+        raise ValueError(msg) from e
+    _select_platforms(_get_environment(lock_file, environment), platforms)
+    conda_lock_data = _convert_env_to_conda_lock(
+        lock_file,
+        environment,
+        platforms=platforms,
+    )
+    chunks: list[str] = []
+    _dump_conda_lock(conda_lock_data, chunks.append)
+    result = "".join(chunks).encode()
+    cache.put(key, result)
+    return result
+
+
+def _content_length(value: str) -> int:
+    """The body size from a Content-Length header, a ValueError if it is invalid."""
+    try:
+        length = int(value)
+    except ValueError:
+        length = -1
+    if length < 0:
+        msg = f"Invalid Content-Length header: {value!r}"
+        raise ValueError(msg)
+    return length
+
+
+def _make_server(host: str, port: int, cache: _ResultCache) -> ThreadingHTTPServer:
+    """An HTTP server that converts lock files, each request on its own thread.
+
+    ``POST /convert`` converts the pixi.lock in the request body with
+    `_convert_request` and responds with the conda-lock YAML (or a 400 with the
+    error message), and ``GET /stats`` responds with the counters of the ``cache``
+    and the latency of the conversions as JSON.
+    """
+    from http import HTTPStatus
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    latency = _LatencyStats()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            if urlsplit(self.path).path != "/stats":
+                self._respond(HTTPStatus.NOT_FOUND, b"Not found\n")
+                return
+            stats = {"cache": cache.stats(), "convert": latency.stats()}
+            self._respond(HTTPStatus.OK, json.dumps(stats).encode(), "application/json")
+
+        def do_POST(self) -> None:  # noqa: N802
+            url = urlsplit(self.path)
+            if url.path != "/convert":
+                self._respond(HTTPStatus.NOT_FOUND, b"Not found\n")
+                return
+            start = time.perf_counter()
+            try:
+                length = _content_length(self.headers.get("Content-Length", "0"))
+                result = _convert_request(self.rfile.read(length), url.query, cache)
+            except ValueError as e:
+                latency.record(time.perf_counter() - start, error=True)
+                self._respond(HTTPStatus.BAD_REQUEST, f"{e}\n".encode())
+                return
+            except Exception:
+                latency.record(time.perf_counter() - start, error=True)
+                logging.exception("Error during conversion")
+                self._respond(HTTPStatus.INTERNAL_SERVER_ERROR, b"Conversion failed\n")
+                return
+            latency.record(time.perf_counter() - start, error=False)
+            self._respond(HTTPStatus.OK, result, "application/yaml")
+
+        def _respond(
+            self,
+            status: HTTPStatus,
+            body: bytes,
+            content_type: str = "text/plain; charset=utf-8",
+        ) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            logging.debug("%s - %s", self.address_string(), format % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,149 @@
+"""Benchmark the stages of a pixi.lock to conda-lock.yml conversion.
+
+The stages are timed separately: parsing the lock file (``parse``), mapping the
+conda packages to their repodata records (``repodata``), building the package
+entries (``entries``) and writing the YAML files (``write``).
+
+Run the scaling benchmark on synthetic lock files (see `tests/synthetic_lock.py`)
+with, e.g.::
+
+    python -m tests.benchmark --sizes 1000 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from rattler import LockFile
+
+from pixi_to_conda_lock import (
+    _get_output_filename,
+    _PackageIndex,
+    _sorted_platforms,
+    _write_conda_lock_file,
+)
+from tests.synthetic_lock import DEFAULT_PLATFORMS, n_entries, write_pixi_lock
+
+STAGES = ("parse", "repodata", "entries", "write")
+
+
+def benchmark_lock_file(lock_path: Path, output_dir: Path) -> dict[str, Any]:
+    """Convert all environments of a lock file and time each stage (in seconds)."""
+    timings = dict.fromkeys(STAGES, 0.0)
+    start = time.perf_counter()
+    lock_file = LockFile.from_path(lock_path)
+    timings["parse"] = time.perf_counter() - start
+
+    n_converted = 0
+    index = _PackageIndex()
+    for env_name, env in lock_file.environments():
+        platforms = _sorted_platforms(env)
+        results = []
+        for platform in platforms:
+            packages = env.packages(platform) or []
+            start = time.perf_counter()
+            index.add_repodata_records(env, platform, packages)
+            timings["repodata"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            results.append(index.platform_entries(platform, packages))
+            timings["entries"] += time.perf_counter() - start
+
+        n_converted += sum(len(result.entries) for result in results)
+        start = time.perf_counter()
+        _write_conda_lock_file(
+            _get_output_filename(output_dir, env_name),
+            env,
+            env_name,
+            platforms,
+            (result.entries for result in results),
+        )
+        timings["write"] += time.perf_counter() - start
+
+    timings["total"] = sum(timings[stage] for stage in STAGES)
+    return {"n_entries": n_converted, "seconds": timings}
+
+
+def synthetic_lock_options(
+    size: int,
+    *,
+    n_environments: int = 4,
+    platforms: tuple[str, ...] = DEFAULT_PLATFORMS,
+    pypi_fraction: float = 0.2,
+    lock_version: int = 6,
+) -> dict[str, Any]:
+    """Options for `write_pixi_lock` that result in (about) size package entries."""
+    per_env_platform = max(size // (n_environments * len(platforms)), 2)
+    n_pypi = int(per_env_platform * pypi_fraction)
+    return {
+        "n_environments": n_environments,
+        "platforms": platforms,
+        "n_conda_packages": per_env_platform - n_pypi,
+        "n_pypi_packages": n_pypi,
+        "lock_version": lock_version,
+    }
+
+
+def benchmark_synthetic(size: int, tmp_dir: Path, **kwargs: Any) -> dict[str, Any]:
+    """Benchmark a synthetic lock file with (about) size package entries."""
+    options = synthetic_lock_options(size, **kwargs)
+    lock_path = write_pixi_lock(tmp_dir / f"pixi-{size}.lock", **options)
+    output_dir = tmp_dir / f"output-{size}"
+    output_dir.mkdir(exist_ok=True)
+    result = benchmark_lock_file(lock_path, output_dir)
+    n_options = {k: v for k, v in options.items() if k != "lock_version"}
+    assert result["n_entries"] == n_entries(**n_options)
+    result["size"] = size
+    result["lock_version"] = options["lock_version"]
+    result["us_per_entry"] = {
+        stage: 1e6 * seconds / result["n_entries"]
+        for stage, seconds in result["seconds"].items()
+    }
+    return result
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000, 100_000],
+        help="Numbers of package entries to benchmark",
+    )
+    parser.add_argument("--environments", type=int, default=4)
+    parser.add_argument("--pypi-fraction", type=float, default=0.2)
+    parser.add_argument("--lock-version", type=int, default=6, choices=[6, 7])
+    parser.add_argument("--json", type=Path, help="Also write the results to a file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run the scaling benchmark and print the per-stage timings."""
+    args = _parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            result = benchmark_synthetic(
+                size,
+                Path(tmp_dir),
+                n_environments=args.environments,
+                pypi_fraction=args.pypi_fraction,
+                lock_version=args.lock_version,
+            )
+            results.append(result)
+            per_entry = ", ".join(
+                f"{stage}={us:.1f}" for stage, us in result["us_per_entry"].items()
+            )
+            print(f"{result['n_entries']:>8} entries (µs/entry): {per_entry}")
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Generate realistic synthetic pixi.lock files of arbitrary size.
+
+Used by the benchmarks (see `tests/benchmark.py`) to measure how the conversion
+scales with the number of environments, platforms and packages.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+from pathlib import Path
+from typing import Any
+
+CONDA_CHANNEL = "https://conda.anaconda.org/conda-forge"
+PYPI_FILES = "https://files.pythonhosted.org/packages"
+DEFAULT_PLATFORMS = ("linux-64", "linux-aarch64", "osx-64", "osx-arm64", "win-64")
+_ARCH = {
+    "linux-64": ("x86_64", "linux"),
+    "linux-aarch64": ("aarch64", "linux"),
+    "osx-64": ("x86_64", "osx"),
+    "osx-arm64": ("arm64", "osx"),
+    "win-64": ("x86_64", "win"),
+}
+_VIRTUAL_PACKAGE = {
+    "linux-64": "__glibc >=2.17,<3.0.a0",
+    "linux-aarch64": "__glibc >=2.17,<3.0.a0",
+    "osx-64": "__osx >=10.13",
+    "osx-arm64": "__osx >=11.0",
+    "win-64": "ucrt >=10.0.20348.0",
+}
+
+
+def _digest(kind: str, value: str) -> str:
+    return hashlib.new(kind, value.encode()).hexdigest()
+
+
+def _version(rng: random.Random) -> str:
+    return f"{rng.randint(0, 30)}.{rng.randint(0, 20)}.{rng.randint(0, 9)}"
+
+
+class _PackagePool:
+    """Shared pools of conda and PyPI packages that environments draw from."""
+
+    def __init__(
+        self,
+        rng: random.Random,
+        platforms: tuple[str, ...],
+        n_conda: int,
+        n_pypi: int,
+        noarch_fraction: float,
+    ) -> None:
+        self.rng = rng
+        self.platforms = platforms
+        self.conda_names = ["pip", "python"] + [
+            f"conda-pkg-{i}" for i in range(max(n_conda - 2, 0))
+        ]
+        self.conda_index = {name: i for i, name in enumerate(self.conda_names)}
+        self.conda_versions = {name: _version(rng) for name in self.conda_names}
+        self.conda_versions["python"] = "3.12.8"
+        self.noarch = {
+            name for name in self.conda_names[2:] if rng.random() < noarch_fraction
+        } | {"pip"}
+        self.pypi_names = [f"pypi-pkg-{i}" for i in range(n_pypi)]
+        self.pypi_index = {name: i for i, name in enumerate(self.pypi_names)}
+        self.pypi_versions = {name: _version(rng) for name in self.pypi_names}
+        self.records: dict[str, dict[str, Any]] = {}
+
+    def conda_url(self, name: str, platform: str) -> str:
+        """URL of a conda package, creating its record on first use."""
+        subdir = "noarch" if name in self.noarch else platform
+        version = self.conda_versions[name]
+        build = f"h{_digest('md5', name + subdir)[:7]}_0"
+        url = f"{CONDA_CHANNEL}/{subdir}/{name}-{version}-{build}.conda"
+        if url not in self.records:
+            self.records[url] = self._conda_record(name, url, subdir)
+        return url
+
+    def _conda_record(self, name: str, url: str, subdir: str) -> dict[str, Any]:
+        index = self.conda_index[name]
+        depends = []
+        if name != "python":
+            for i in sorted(
+                {self.rng.randrange(1, index) for _ in range(4)} if index > 1 else (),
+            ):
+                dep = self.conda_names[i]
+                major = self.conda_versions[dep].split(".", 1)[0]
+                depends.append(f"{dep} >={self.conda_versions[dep]},<{int(major) + 1}")
+        if subdir == "noarch":
+            depends.append("python >=3.9")
+        else:
+            depends.append(_VIRTUAL_PACKAGE[subdir])
+        record: dict[str, Any] = {
+            "conda": url,
+            "sha256": _digest("sha256", url),
+            "md5": _digest("md5", url),
+        }
+        if subdir == "noarch":
+            record["noarch"] = "python"
+        else:
+            record["arch"], record["platform"] = _ARCH[subdir]
+        record.update(
+            {
+                "depends": depends,
+                "license": "MIT",
+                "license_family": "MIT",
+                "size": self.rng.randint(10_000, 50_000_000),
+                "timestamp": 1700000000000 + self.rng.randint(0, 10**10),
+            },
+        )
+        return record
+
+    def pypi_url(self, name: str) -> str:
+        """URL of a (pure Python) wheel, creating its record on first use."""
+        version = self.pypi_versions[name]
+        filename = f"{name.replace('-', '_')}-{version}-py3-none-any.whl"
+        digest = _digest("sha256", filename)
+        url = f"{PYPI_FILES}/{digest[:2]}/{digest[2:4]}/{digest[4:]}/{filename}"
+        if url not in self.records:
+            index = self.pypi_index[name]
+            requires_dist = [
+                f"{self.pypi_names[i]}>={self.pypi_versions[self.pypi_names[i]]}"
+                for i in sorted(
+                    {self.rng.randrange(index) for _ in range(3)} if index else (),
+                )
+            ]
+            requires_dist += [
+                "pytest ; extra == 'test'",
+                'tomli>=1.1.0 ; python_full_version < "3.11"',
+            ]
+            self.records[url] = {
+                "pypi": url,
+                "name": name,
+                "version": version,
+                "sha256": _digest("sha256", url),
+                "requires_dist": requires_dist,
+                "requires_python": ">=3.9",
+            }
+        return url
+
+
+def generate_pixi_lock(
+    *,
+    n_environments: int = 1,
+    platforms: tuple[str, ...] = DEFAULT_PLATFORMS,
+    n_conda_packages: int = 100,
+    n_pypi_packages: int = 0,
+    lock_version: int = 6,
+    shared_fraction: float = 0.8,
+    noarch_fraction: float = 0.3,
+    seed: int = 0,
+) -> str:
+    """Generate the contents of a synthetic pixi.lock file.
+
+    Every environment locks ``n_conda_packages`` conda and ``n_pypi_packages`` PyPI
+    packages on each of the ``platforms``. A ``shared_fraction`` of these is
+    common to all environments, like in real multi-environment lock files, and a
+    ``noarch_fraction`` of the conda packages is noarch.
+
+    Args:
+        n_environments: Number of environments ("default", "env-1", ...)
+        platforms: The platforms of every environment
+        n_conda_packages: Number of conda packages per environment and platform
+        n_pypi_packages: Number of PyPI packages per environment and platform
+        lock_version: The pixi.lock format version, 6 or 7
+        shared_fraction: Fraction of packages shared by all environments
+        noarch_fraction: Fraction of conda packages that is noarch
+        seed: Seed for the random number generator
+
+    """
+    if lock_version not in (6, 7):
+        msg = f"Unsupported lock version: {lock_version}"
+        raise ValueError(msg)
+    rng = random.Random(seed)  # noqa: S311
+    n_conda_packages = max(n_conda_packages, 2)  # always python and pip
+    n_shared_conda = max(int(n_conda_packages * shared_fraction), 2)
+    n_shared_pypi = int(n_pypi_packages * shared_fraction)
+    pool = _PackagePool(
+        rng,
+        platforms,
+        n_shared_conda + (n_conda_packages - n_shared_conda) * n_environments,
+        n_shared_pypi + (n_pypi_packages - n_shared_pypi) * n_environments,
+        noarch_fraction,
+    )
+
+    extra_conda = n_conda_packages - n_shared_conda
+    extra_pypi = n_pypi_packages - n_shared_pypi
+    environments: dict[str, Any] = {}
+    for i in range(n_environments):
+        env_name = "default" if i == 0 else f"env-{i}"
+        conda_start = n_shared_conda + i * extra_conda
+        pypi_start = n_shared_pypi + i * extra_pypi
+        conda_names = (
+            pool.conda_names[:n_shared_conda]
+            + pool.conda_names[conda_start : conda_start + extra_conda]
+        )
+        pypi_names = (
+            pool.pypi_names[:n_shared_pypi]
+            + pool.pypi_names[pypi_start : pypi_start + extra_pypi]
+        )
+        packages = {
+            platform: [
+                {"conda": pool.conda_url(name, platform)} for name in conda_names
+            ]
+            + [{"pypi": pool.pypi_url(name)} for name in pypi_names]
+            for platform in platforms
+        }
+        env: dict[str, Any] = {"channels": [{"url": f"{CONDA_CHANNEL}/"}]}
+        if pypi_names:
+            env["indexes"] = ["https://pypi.org/simple"]
+        env["packages"] = packages
+        environments[env_name] = env
+
+    data: dict[str, Any] = {"version": lock_version}
+    if lock_version == 7:  # noqa: PLR2004
+        data["platforms"] = [{"name": platform} for platform in platforms]
+    data["environments"] = environments
+    data["packages"] = sorted(
+        pool.records.values(),
+        key=lambda r: r.get("conda", r.get("pypi")),
+    )
+    lines: list[str] = []
+    _dump_block(data, "", lines)
+    return "".join(lines)
+
+
+def _dump_block(value: Any, indent: str, lines: list[str]) -> None:
+    """Dump data as block-style YAML, much faster than `yaml.dump` for large locks.
+
+    Strings are written as JSON strings, which are valid double-quoted YAML scalars.
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (dict, list)) and item:
+                lines.append(f"{indent}{key}:\n")
+                _dump_block(
+                    item,
+                    indent if isinstance(item, list) else indent + "  ",
+                    lines,
+                )
+            else:
+                lines.append(f"{indent}{key}: {_scalar(item)}\n")
+    else:
+        for item in value:
+            if isinstance(item, dict):
+                item_lines: list[str] = []
+                _dump_block(item, indent + "  ", item_lines)
+                item_lines[0] = f"{indent}- " + item_lines[0][len(indent) + 2 :]
+                lines.extend(item_lines)
+            else:
+                lines.append(f"{indent}- {_scalar(item)}\n")
+
+
+def _scalar(value: Any) -> str:
+    if isinstance(value, str):
+        return json.dumps(value)
+    if isinstance(value, (list, dict)):
+        return "[]" if isinstance(value, list) else "{}"
+    return str(value)
+
+
+def write_pixi_lock(path: str | Path, **kwargs: Any) -> Path:
+    """Write a synthetic pixi.lock file, see `generate_pixi_lock` for the options."""
+    path = Path(path)
+    path.write_text(generate_pixi_lock(**kwargs))
+    return path
+
+
+def n_entries(
+    *,
+    n_environments: int = 1,
+    platforms: tuple[str, ...] = DEFAULT_PLATFORMS,
+    n_conda_packages: int = 100,
+    n_pypi_packages: int = 0,
+) -> int:
+    """Total number of conda-lock package entries for a synthetic lock file."""
+    return (
+        n_environments * len(platforms) * (max(n_conda_packages, 2) + n_pypi_packages)
+    )
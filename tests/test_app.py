@@ -2,27 +2,70 @@
 
 from __future__ import annotations
 
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
 from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, cast
 from unittest.mock import Mock, patch
 
 import pytest
 import yaml
-from rattler import CondaLockedPackage, LockFile, Platform, PypiLockedPackage
+from rattler import (
+    CondaLockedPackage,
+    Environment,
+    LockFile,
+    Platform,
+    PypiLockedPackage,
+)
 
 from pixi_to_conda_lock import (
+    Profiler,
+    _apply_artifact_hashes,
+    _ArtifactHashes,
     _convert_env_to_conda_lock,
+    _convert_envs_in_parallel,
     _create_conda_lock_metadata,
     _create_conda_package_entry,
     _create_pypi_package_entry,
+    _dump_conda_lock,
+    _get_environment,
     _get_output_filename,
+    _iter_platform_entries,
     _list_of_str_dependencies_to_dict,
+    _make_server,
+    _mirror_map,
+    _package_requirements,
+    _PackageEntry,
+    _PackageIndex,
     _parse_args,
+    _planned_index,
     _prepare_output_directory,
-    _write_yaml_file,
+    _reachable_packages,
+    _ResultCache,
+    _sorted_platforms,
+    _watch,
+    _write_conda_lock_file,
     convert,
+    convert_to_dict,
+    iter_conda_lock_packages,
     main,
 )
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from rattler import LockedPackage
+
 TEST_DIR = Path(__file__).parent
 PIXI_LOCK_PATH = TEST_DIR / "test_data" / "pixi.lock"
 PIXI_LOCK_V7_PATH = TEST_DIR / "test_data" / "pixi-v7.lock"
@@ -41,24 +84,103 @@ def lock_file_pypi() -> LockFile:
     return LockFile.from_path(PIXI_LOCK_PYPI_PATH)
 
 
-def test_write_yaml_file(tmp_path: Path) -> None:
-    """Test write_yaml_file."""
-    file_path = tmp_path / "test.yaml"
-    data = {"key": "value"}
-    _write_yaml_file(file_path, data)
-    with open(file_path) as f:
-        read_data = yaml.safe_load(f)
-    assert read_data == data
+def _dump(data: dict) -> str:
+    """The conda-lock data as written by `_dump_conda_lock`."""
+    chunks: list[str] = []
+    _dump_conda_lock(data, chunks.append)
+    return "".join(chunks)
+
+
+def _write(file_path: Path, lock_file: LockFile, env_name: str) -> bool:
+    """Write the conda-lock file of an environment as the conversions do."""
+    env = _get_environment(lock_file, env_name)
+    platforms = _sorted_platforms(env)
+    return _write_conda_lock_file(
+        file_path,
+        env,
+        env_name,
+        platforms,
+        _iter_platform_entries(env, platforms, env_name, None, _PackageIndex()),
+    )
+
+
+def test_write_conda_lock_file_only_if_changed(
+    lock_file: LockFile,
+    tmp_path: Path,
+) -> None:
+    """Test that unchanged files are not rewritten and writes are atomic."""
+    file_path = tmp_path / "conda-lock.yml"
+    assert _write(file_path, lock_file, "default")
+    assert file_path.read_text() == _dump(
+        _convert_env_to_conda_lock(lock_file, "default"),
+    )
+    file_path.chmod(0o640)
+    os.utime(file_path, ns=(0, 0))
+    assert not _write(file_path, lock_file, "default")
+    assert file_path.stat().st_mtime_ns == 0
+
+    assert _write(file_path, lock_file, "project2")
+    assert file_path.stat().st_mtime_ns != 0
+    assert file_path.stat().st_mode & 0o777 == 0o640  # noqa: PLR2004
+    content = file_path.read_bytes()
+
+    def fail(_entry: object, write: Callable[[str], object]) -> None:
+        write("- name: partial\n")
+        msg = "interrupted"
+        raise RuntimeError(msg)
+
+    with (
+        patch("pixi_to_conda_lock._dump_package_entry", side_effect=fail),
+        pytest.raises(RuntimeError, match="interrupted"),
+    ):
+        _write(file_path, lock_file, "default")
+    assert file_path.read_bytes() == content
+    assert [p.name for p in tmp_path.iterdir()] == ["conda-lock.yml"]
 
 
 def test_create_conda_lock_metadata() -> None:
     """Test create_conda_lock_metadata."""
     platforms = ["linux-64", "osx-64"]
     channels = [{"url": "conda-forge", "used_env_vars": []}]
-    metadata = _create_conda_lock_metadata(platforms, channels)
+    content_hashes = {"linux-64": "abc", "osx-64": "def"}
+    metadata = _create_conda_lock_metadata(platforms, channels, content_hashes)
     assert metadata["platforms"] == ["linux-64", "osx-64"]
     assert metadata["channels"] == channels
-    assert "content_hash" in metadata
+    assert metadata["content_hash"] == content_hashes
+
+
+def test_content_hash(lock_file: LockFile) -> None:
+    """Test that content hashes are per-platform digests of the locked packages."""
+    default = _convert_env_to_conda_lock(lock_file, "default")
+    content_hash = default["metadata"]["content_hash"]
+    assert set(content_hash) == {"osx-64", "osx-arm64"}
+    assert content_hash["osx-64"] != content_hash["osx-arm64"]
+    env = _get_environment(lock_file, "default")
+    for lock_platform in env.platforms():
+        platform, digest = str(lock_platform), content_hash[str(lock_platform)]
+        expected = hashlib.sha256()
+        entries = [e for e in default["package"] if e["platform"] == platform]
+        packages = env.packages(lock_platform) or []
+        assert [e["name"] for e in entries] == [p.name for p in packages]
+        for entry, package in zip(entries, packages):
+            hashes = entry["hash"]
+            requirements = "\0".join(_package_requirements(package))
+            expected.update(
+                f"{entry['manager']}\0{entry['name']}\0{entry['version']}"
+                f"\0{entry['url']}\0{hashes.get('md5', '')}"
+                f"\0{hashes.get('sha256', '')}\0{requirements}\n".encode(),
+            )
+        assert digest == expected.hexdigest()
+    # project1 has the same packages as default, project2 does not
+    project1 = _convert_env_to_conda_lock(
+        LockFile.from_path(PIXI_LOCK_PATH),
+        "project1",
+    )
+    assert project1["metadata"]["content_hash"] == content_hash
+    project2 = _convert_env_to_conda_lock(lock_file, "project2")
+    assert (
+        project2["metadata"]["content_hash"]["osx-arm64"] != content_hash["osx-arm64"]
+    )
 
 
 def test_get_output_filename(tmp_path: Path) -> None:
@@ -166,7 +288,7 @@ def test_main_exception(tmp_path: Path) -> None:
             ["pixi-to-conda-lock", str(PIXI_LOCK_PATH), "-o", str(tmp_path)],
         ),
         patch(
-            "pixi_to_conda_lock._convert_env_to_conda_lock",
+            "pixi_to_conda_lock._iter_platform_entries",
             side_effect=Exception("Test exception"),
         ),
     ):
@@ -208,6 +330,22 @@ def test_create_conda_package_entry(lock_file: LockFile) -> None:
     assert "sha256" in result["hash"]
 
 
+def test_package_entry_dict_view(lock_file: LockFile) -> None:
+    """Test that the compact entries behave like the conda-lock entry dicts."""
+    conda_lock_data = _convert_env_to_conda_lock(lock_file, "default")
+    expected = yaml.safe_load(_dump(conda_lock_data))["package"]
+    entries = conda_lock_data["package"]
+    assert all(isinstance(entry, _PackageEntry) for entry in entries)
+    assert not hasattr(entries[0], "__dict__")
+    assert entries == expected
+    assert [entry.to_dict() for entry in entries] == expected
+    assert list(entries[0]) == list(expected[0])
+    assert pickle.loads(pickle.dumps(entries)) == expected  # noqa: S301
+    assert yaml.safe_load(yaml.safe_dump(entries)) == expected
+    with pytest.raises(KeyError):
+        entries[0]["md5"]
+
+
 def test_create_pypi_package_entry(lock_file_pypi: LockFile) -> None:
     """Test the creation of pypi package entries."""
     env = lock_file_pypi.environment("default")
@@ -226,16 +364,16 @@ def test_create_pypi_package_entry(lock_file_pypi: LockFile) -> None:
     assert result["manager"] == "pip"
     assert result["platform"] == str(platform)
     assert result["dependencies"] == {
-        "myst-parser ; extra": "== 'docs'",
-        "sphinx ; extra": "== 'docs'",
-        "furo ; extra": "== 'docs'",
-        "emoji ; extra": "== 'docs'",
-        "sphinx-autodoc-typehints ; extra": "== 'docs'",
-        "pytest ; extra": "== 'test'",
-        "pre-commit ; extra": "== 'test'",
-        "coverage ; extra": "== 'test'",
-        "pytest-cov ; extra": "== 'test'",
-        "pytest-mock ; extra": "== 'test'",
+        "myst-parser": "; extra == 'docs'",
+        "sphinx": "; extra == 'docs'",
+        "furo": "; extra == 'docs'",
+        "emoji": "; extra == 'docs'",
+        "sphinx-autodoc-typehints": "; extra == 'docs'",
+        "pytest": "; extra == 'test'",
+        "pre-commit": "; extra == 'test'",
+        "coverage": "; extra == 'test'",
+        "pytest-cov": "; extra == 'test'",
+        "pytest-mock": "; extra == 'test'",
     }
     assert "url" in result
     assert "hash" in result
@@ -333,7 +471,7 @@ def test_list_of_str_dependencies_to_dict() -> None:
         "importlib-metadata": ">=4.11.4",
         "python-dotenv": ">=1.0.1",
         "qiskit": ">=1.0.0 ; extra == 'test'",
-        "pytest ; extra": "== 'test'",
+        "pytest": "; extra == 'test'",
         "requests-mock": ">=1.8.0 ; extra == 'test'",
         "pytest-cov": "==2.10.1 ; extra == 'test'",
     }
@@ -361,6 +499,36 @@ def test_list_of_str_dependencies_to_dict() -> None:
     assert result_complex == expected_complex
 
 
+def test_list_of_str_dependencies_to_dict_build_strings_extras_markers() -> None:
+    """Test that build strings, extras and markers do not end up in the names."""
+    result = _list_of_str_dependencies_to_dict(
+        [
+            "python >=3.9,<3.10.0a0 *_cpython",
+            "python_abi 3.13.* *_cp313",
+            "libgcc-ng",
+            'foo[bar,baz]>=1; python_version<"3.10"',
+            "pkg @ https://example.com/pkg-1.0-py3-none-any.whl",
+            "old-style (>=1.0)",
+            "",
+            "kombu<5.6,>=5.5.2",
+            'kombu[sqs]>=5.5.0 ; extra == "sqs"',
+            'vine ; extra == "x"',
+            "vine>=5",
+        ],
+    )
+    assert result == {
+        "python": ">=3.9,<3.10.0a0 *_cpython",
+        "python_abi": "3.13.* *_cp313",
+        "libgcc-ng": "*",
+        "foo": '[bar,baz]>=1; python_version<"3.10"',
+        "pkg": "@ https://example.com/pkg-1.0-py3-none-any.whl",
+        "old-style": "(>=1.0)",
+        # The requirements without a marker are kept
+        "kombu": "<5.6,>=5.5.2",
+        "vine": ">=5",
+    }
+
+
 def test_convert(tmp_path: Path) -> None:
     """Test the convert function."""
     output = tmp_path / "conda-lock.yml"
@@ -406,8 +574,1225 @@ def test_no_pip_but_pypi_packages(tmp_path: Path) -> None:
         _convert_env_to_conda_lock(lock_file, "default")
 
 
+def test_no_pip_fails_before_writing(tmp_path: Path) -> None:
+    """Test that a missing pip on the last platform fails before anything is written."""
+    with open(PIXI_LOCK_PYPI_PATH) as f:
+        data = yaml.safe_load(f)
+    packages = data["environments"]["default"]["packages"]
+    last_platform = sorted(packages)[-1]
+    packages[last_platform] = [
+        dct for dct in packages[last_platform] if "/pip-" not in dct.get("conda", "")
+    ]
+    lock_path = tmp_path / "pixi.lock"
+    with open(lock_path, "w") as f:
+        yaml.safe_dump(data, f)
+    output = tmp_path / "conda-lock.yml"
+    output.write_text("old")
+    with (
+        patch(
+            "pixi_to_conda_lock._create_conda_package_entry",
+            side_effect=_create_conda_package_entry,
+        ) as mock_create,
+        pytest.raises(ValueError, match="no pip package found"),
+    ):
+        convert(lock_path, conda_lock_path=output, use_cache=False)
+    mock_create.assert_not_called()
+    assert output.read_text() == "old"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["conda-lock.yml", "pixi.lock"]
+
+
 def test_convert_env_to_conda_lock_with_pypi(lock_file_pypi: LockFile) -> None:
     """Test _convert_env_to_conda_lock with a lock file containing pip packages."""
     _convert_env_to_conda_lock(lock_file_pypi, "default")
     _convert_env_to_conda_lock(lock_file_pypi, "project1")
     _convert_env_to_conda_lock(lock_file_pypi, "project2")
+
+
+@pytest.mark.parametrize("lock_path", [PIXI_LOCK_PATH, PIXI_LOCK_PYPI_PATH])
+def test_main_parallel_matches_serial(tmp_path: Path, lock_path: Path) -> None:
+    """Test that `--jobs` produces byte-identical output to the serial path."""
+    serial_dir = tmp_path / "serial"
+    parallel_dir = tmp_path / "parallel"
+    for output_dir, jobs in [(serial_dir, "1"), (parallel_dir, "2")]:
+        with patch(
+            "sys.argv",
+            ["pixi-to-conda-lock", str(lock_path), "-o", str(output_dir), "-j", jobs],
+        ):
+            assert main() == 0
+
+    serial_files = sorted(p.name for p in serial_dir.glob("*.yml"))
+    assert serial_files == sorted(p.name for p in parallel_dir.glob("*.yml"))
+    assert len(serial_files) == 3  # noqa: PLR2004
+    for name in serial_files:
+        assert (serial_dir / name).read_bytes() == (parallel_dir / name).read_bytes()
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_main_platform_filter(tmp_path: Path, jobs: str) -> None:
+    """Test that --platform only converts (and looks up) the selected platforms."""
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PATH), "-o", str(tmp_path), "-j", jobs]
+    with (
+        patch(
+            "rattler.Environment.conda_repodata_records_for_platform",
+            autospec=True,
+            side_effect=Environment.conda_repodata_records_for_platform,
+        ) as mock_records,
+        patch("sys.argv", [*argv, "-p", "osx-64"]),
+    ):
+        assert main() == 0
+    if jobs == "1":
+        assert {str(call.args[1]) for call in mock_records.call_args_list} == {
+            "osx-64",
+        }
+    # project2 only has osx-arm64
+    assert sorted(p.name for p in tmp_path.glob("*.yml")) == [
+        "conda-lock.yml",
+        "project1.conda-lock.yml",
+    ]
+    with (tmp_path / "conda-lock.yml").open() as f:
+        conda_lock_data = yaml.safe_load(f)
+    assert conda_lock_data["metadata"]["platforms"] == ["osx-64"]
+    assert list(conda_lock_data["metadata"]["content_hash"]) == ["osx-64"]
+    assert {p["platform"] for p in conda_lock_data["package"]} == {"osx-64"}
+
+    # The cache does not mistake the filtered output for the full one
+    with patch("sys.argv", argv):
+        assert main() == 0
+    with (tmp_path / "conda-lock.yml").open() as f:
+        conda_lock_data = yaml.safe_load(f)
+    assert conda_lock_data["metadata"]["platforms"] == ["osx-64", "osx-arm64"]
+
+    with patch("sys.argv", [*argv, "-e", "project2", "-p", "osx-64"]):
+        assert main() == 1
+    with pytest.raises(ValueError, match="osx-64 not found"):
+        convert(PIXI_LOCK_PATH, "project2", tmp_path / "out.yml", platforms=["osx-64"])
+
+
+def test_main_explicit(tmp_path: Path) -> None:
+    """Test that --explicit writes @EXPLICIT and pip requirements files."""
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PYPI_PATH), "-o", str(tmp_path)]
+    with patch("sys.argv", [*argv, "--explicit"]):
+        assert main() == 0
+    conda_lock_data = convert_to_dict(PIXI_LOCK_PYPI_PATH)
+    for platform in conda_lock_data["metadata"]["platforms"]:
+        entries = [p for p in conda_lock_data["package"] if p["platform"] == platform]
+        lines = (tmp_path / f"conda-{platform}.lock").read_text().splitlines()
+        assert lines[1] == f"# platform: {platform}"
+        content_hash = conda_lock_data["metadata"]["content_hash"][platform]
+        assert lines[2] == f"# content_hash: {content_hash}"
+        assert lines[3:] == ["@EXPLICIT"] + [
+            f"{p['url']}#{p['hash']['md5']}" for p in entries if p["manager"] == "conda"
+        ]
+        lines = (tmp_path / f"requirements-{platform}.txt").read_text().splitlines()
+        assert lines[3:] == [
+            f"{p['name']} @ {p['url']} --hash=sha256:{p['hash']['sha256']}"
+            for p in entries
+            if p["manager"] == "pip"
+        ]
+    # project2 has no PyPI packages
+    assert (tmp_path / "project2.conda-osx-arm64.lock").exists()
+    assert not list(tmp_path.glob("project2.requirements-*.txt"))
+
+    # Explicit files that were removed (or modified) since are written again
+    for file_path in [
+        tmp_path / "conda-osx-64.lock",
+        tmp_path / "project2.conda-osx-arm64.lock",
+        tmp_path / "requirements-osx-64.txt",
+    ]:
+        content = file_path.read_text()
+        file_path.unlink()
+        with patch("sys.argv", [*argv, "--explicit"]):
+            assert main() == 0
+        assert file_path.read_text() == content
+
+
+def test_main_batch_local_packages(tmp_path: Path) -> None:
+    """Test that a batch does not share the entries of packages with local paths."""
+    content = PIXI_LOCK_PYPI_PATH.read_text()
+    url = next(p["pypi"] for p in yaml.safe_load(content)["packages"] if "pypi" in p)
+    for project in ("proja", "projb"):
+        # The project itself as an editable package, at the same relative path
+        (tmp_path / project).mkdir()
+        (tmp_path / project / "pixi.lock").write_text(
+            content.replace(url, ".").replace("name: numthreads", f"name: {project}"),
+        )
+    argv = ["pixi-to-conda-lock", str(tmp_path / "proja"), str(tmp_path / "projb")]
+    with patch("sys.argv", [*argv, "--jobs", "1"]):
+        assert main() == 0
+    for project, other in [("proja", "projb"), ("projb", "proja")]:
+        with (tmp_path / project / "conda-lock.yml").open() as f:
+            names = {p["name"] for p in yaml.safe_load(f)["package"]}
+        assert project in names
+        assert other not in names
+
+
+def test_main_local_package_requirements(tmp_path: Path) -> None:
+    """Test that a changed requirement of a package without hashes is not missed."""
+    content = PIXI_LOCK_PYPI_PATH.read_text()
+    url = next(p["pypi"] for p in yaml.safe_load(content)["packages"] if "pypi" in p)
+    sha256 = (
+        "  sha256: e56e83cbccef103901e678aa014d64b203cdb1b3a3be7cdedb2516ef62ec8fa1\n"
+    )
+    assert sha256 in content
+    content = content.replace(url, ".").replace(sha256, "")
+    lock_path = tmp_path / "pixi.lock"
+    lock_path.write_text(content)
+    argv = ["pixi-to-conda-lock", str(lock_path), "-e", "default", "-o", str(tmp_path)]
+    with patch("sys.argv", argv):
+        assert main() == 0
+
+    lock_path.write_text(
+        content.replace("  requires_dist:\n", "  requires_dist:\n  - tqdm\n"),
+    )
+    with patch("sys.argv", [*argv, "--check"]):
+        assert main() == 1
+    with patch("sys.argv", argv):
+        assert main() == 0
+    with (tmp_path / "conda-lock.yml").open() as f:
+        packages = yaml.safe_load(f)["package"]
+    (numthreads,) = {p["name"]: p for p in packages if p["manager"] == "pip"}.values()
+    assert numthreads["dependencies"]["tqdm"] == "*"
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_main_batch(tmp_path: Path, jobs: str) -> None:
+    """Test converting many lock files (and a glob) with a JSON summary."""
+    projects = tmp_path / "projects"
+    for name, lock_path in [("a", PIXI_LOCK_PATH), ("b", PIXI_LOCK_PYPI_PATH)]:
+        (projects / name).mkdir(parents=True)
+        (projects / name / "pixi.lock").write_bytes(lock_path.read_bytes())
+    output_dir = tmp_path / "output"
+    summary_path = tmp_path / "summary.json"
+    argv = [
+        "pixi-to-conda-lock",
+        str(projects / "*" / "pixi.lock"),
+        str(projects / "missing" / "pixi.lock"),
+        "-o",
+        str(output_dir),
+        "-j",
+        jobs,
+        "--summary",
+        str(summary_path),
+    ]
+    with patch("sys.argv", argv):
+        assert main() == 1  # projects/missing/pixi.lock does not exist
+    summary = json.loads(summary_path.read_text())
+    assert summary["n_failed"] == 1
+    statuses = {
+        Path(item["lock_file"]).parent.name: item["status"]
+        for item in summary["lock_files"]
+    }
+    assert statuses == {"a": "converted", "b": "converted", "missing": "failed"}
+    for name, lock_path in [("a", PIXI_LOCK_PATH), ("b", PIXI_LOCK_PYPI_PATH)]:
+        expected = convert_to_dict(lock_path)
+        with (output_dir / name / "conda-lock.yml").open() as f:
+            assert yaml.safe_load(f) == expected
+        assert len(list((output_dir / name).glob("*.yml"))) == 3  # noqa: PLR2004
+
+    with patch("sys.argv", argv[:2] + argv[3:]):
+        assert main() == 0
+    summary = json.loads(summary_path.read_text())
+    assert [item["status"] for item in summary["lock_files"]] == ["unchanged"] * 2
+
+    # A single directory is converted like a batch, next to its pixi.lock
+    with patch("sys.argv", [argv[0], str(projects / "a"), *argv[-2:]]):
+        assert main() == 0
+    (item,) = json.loads(summary_path.read_text())["lock_files"]
+    assert item["environments"] == ["default", "project1", "project2"]
+    assert (projects / "a" / "conda-lock.yml").exists()
+
+
+@pytest.mark.parametrize(
+    "lock_path",
+    [PIXI_LOCK_PATH, PIXI_LOCK_V7_PATH, PIXI_LOCK_PYPI_PATH],
+)
+def test_dump_conda_lock_matches_yaml_dump(lock_path: Path) -> None:
+    """Test that the conda-lock emitter output parses identically to `yaml.dump`."""
+    lock_file = LockFile.from_path(lock_path)
+    for env_name, _ in lock_file.environments():
+        data = _convert_env_to_conda_lock(lock_file, env_name)
+        assert yaml.safe_load(_dump(data)) == yaml.safe_load(
+            yaml.dump(data, sort_keys=False),
+        )
+
+
+def test_dump_conda_lock_tricky_scalars() -> None:
+    """Test that scalars that need quoting survive the conda-lock emitter."""
+    tricky = [
+        "1.0",
+        "1e3",
+        "0x1F",
+        "2025",
+        "yes",
+        "No",
+        "null",
+        "~",
+        "",
+        " leading",
+        "trailing ",
+        "trailing:",
+        "key: value",
+        "a #comment",
+        "#comment",
+        "- item",
+        "-1",
+        "? x",
+        ">=1.0",
+        "<2",
+        "|x",
+        "*alias",
+        "&anchor",
+        "!tag",
+        "%directive",
+        "@at",
+        "`tick",
+        "'quoted'",
+        '"double"',
+        "it's",
+        "=",
+        "<<",
+        "[flow]",
+        "{flow}",
+        "tab\there",
+        "new\nline",
+        "ünïcödé",
+        "python >=3.9,<3.10.0a0 *_cpython",
+        "== 'docs'",
+        "~=1.7.0",
+    ]
+    entry = {
+        "name": "tricky",
+        "version": "1.0",
+        "manager": "conda",
+        "platform": "linux-64",
+        "dependencies": {f"dep{i}": value for i, value in enumerate(tricky)}
+        | {value: "*" for value in tricky},
+        "url": "https://example.com/tricky-1.0-0.conda",
+        "hash": {},
+        "category": "main",
+        "optional": False,
+    }
+    data = {
+        "version": 1,
+        "metadata": {
+            "content_hash": {"linux-64": "2025"},
+            "channels": [{"url": "conda-forge", "used_env_vars": []}],
+            "platforms": ["linux-64"],
+            "sources": tricky,
+        },
+        "package": [entry],
+    }
+    assert yaml.safe_load(_dump(data)) == data
+
+    data["package"] = []
+    assert yaml.safe_load(_dump(data)) == data
+
+
+def test_main_skips_unchanged_environments(tmp_path: Path) -> None:
+    """Test that unchanged environments are not converted again."""
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PATH), "-o", str(tmp_path)]
+    with patch("sys.argv", argv):
+        assert main() == 0
+    assert (tmp_path / ".pixi-to-conda-lock-cache.json").exists()
+
+    with (
+        patch("sys.argv", argv),
+        patch(
+            "pixi_to_conda_lock._iter_platform_entries",
+            side_effect=_iter_platform_entries,
+        ) as mock_convert,
+    ):
+        assert main() == 0
+        mock_convert.assert_not_called()
+
+        # A modified or removed output is regenerated
+        (tmp_path / "conda-lock.yml").write_text("modified")
+        (tmp_path / "project1.conda-lock.yml").unlink()
+        assert main() == 0
+        assert sorted(call.args[2] for call in mock_convert.call_args_list) == [
+            "default",
+            "project1",
+        ]
+
+        mock_convert.reset_mock()
+        with patch("sys.argv", [*argv, "--no-cache"]):
+            assert main() == 0
+        assert mock_convert.call_count == 3  # noqa: PLR2004
+
+
+def test_main_check(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test that --check finds stale outputs, from their headers where possible."""
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PYPI_PATH), "-o", str(tmp_path)]
+    with patch("sys.argv", [*argv, "--explicit"]):
+        assert main() == 0
+    files = sorted(tmp_path.iterdir())
+
+    def check(*extra: str) -> tuple[int, list[str]]:
+        with (
+            patch("sys.argv", [*argv, "--check", *extra]),
+            patch(
+                "pixi_to_conda_lock._iter_platform_entries",
+                side_effect=_iter_platform_entries,
+            ) as mock_convert,
+        ):
+            exit_code = main()
+        return exit_code, [call.args[2] for call in mock_convert.call_args_list]
+
+    assert check() == (0, [])  # decided from the headers alone
+    exit_code, converted = check("--explicit")
+    assert exit_code == 0
+    assert sorted(converted) == ["default", "project1", "project2"]
+
+    # Another converter version writes the same files, so they are not stale
+    with patch("pixi_to_conda_lock._converter_version", return_value="0.0.0"):
+        assert check() == (0, [])
+    # The package entries are part of the header too
+    default = tmp_path / "conda-lock.yml"
+    content = default.read_text()
+    default.write_text(content.replace("url: https://", "url: http://", 1))
+    project1 = tmp_path / "project1.conda-lock.yml"
+    project1.write_text(project1.read_text().replace("osx-64:", "osx-64: x", 1))
+    caplog.clear()
+    assert check() == (1, [])
+    assert "Stale conda-lock files" in caplog.text
+    assert caplog.records[-1].message.endswith(": default, project1")
+    default.write_text(content)
+    project1.write_text("not a conda-lock file")  # no header, so it is converted
+    assert check("-e", "project1") == (1, ["project1"])
+    project1.unlink()
+    assert check("-e", "project2") == (0, [])
+    assert check() == (1, [])
+    assert sorted(tmp_path.iterdir()) == [f for f in files if f != project1]
+
+
+def test_main_split_platforms(tmp_path: Path) -> None:
+    """Test writing a conda-lock file per platform, each with its own metadata."""
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PYPI_PATH), "-o", str(tmp_path)]
+    with patch("sys.argv", [*argv, "--split-platforms"]):
+        assert main() == 0
+    combined = convert_to_dict(PIXI_LOCK_PYPI_PATH, "project1")
+    platforms = combined["metadata"]["platforms"]
+    assert len(platforms) > 1
+    for platform in platforms:
+        with (tmp_path / f"project1.conda-lock.{platform}.yml").open() as f:
+            data = yaml.safe_load(f)
+        assert data["metadata"]["platforms"] == [platform]
+        assert data["metadata"]["content_hash"] == {
+            platform: combined["metadata"]["content_hash"][platform],
+        }
+        assert data["package"] == [
+            p for p in combined["package"] if p["platform"] == platform
+        ]
+    assert not (tmp_path / "project1.conda-lock.yml").exists()
+
+    with (
+        patch("sys.argv", [*argv, "--split-platforms"]),
+        patch(
+            "pixi_to_conda_lock._iter_platform_entries",
+            side_effect=_iter_platform_entries,
+        ) as mock_convert,
+    ):
+        assert main() == 0  # unchanged
+        mock_convert.assert_not_called()
+    with patch("sys.argv", [*argv, "--split-platforms", "--check"]):
+        assert main() == 0
+    with patch("sys.argv", [*argv, "--check"]):
+        assert main() == 1  # the files per environment do not exist
+
+    output = tmp_path / "convert" / "conda-lock.yml"
+    output.parent.mkdir()
+    convert(PIXI_LOCK_PYPI_PATH, conda_lock_path=output, split_platforms=True)
+    assert sorted(p.name for p in output.parent.glob("*.yml")) == [
+        f"conda-lock.{platform}.yml" for platform in platforms
+    ]
+
+
+def test_main_merge(tmp_path: Path) -> None:
+    """Test merging all environments into one conda-lock file with categories."""
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PATH), "-o", str(tmp_path)]
+    with patch("sys.argv", [*argv, "--merge"]):
+        assert main() == 0
+    assert [p.name for p in tmp_path.glob("*.yml")] == ["conda-lock.yml"]
+    with (tmp_path / "conda-lock.yml").open() as f:
+        merged = yaml.safe_load(f)
+    envs = {
+        env_name: convert_to_dict(PIXI_LOCK_PATH, env_name)
+        for env_name in ("default", "project1", "project2")
+    }
+    assert merged["metadata"]["platforms"] == ["osx-64", "osx-arm64"]
+    main_packages = [p for p in merged["package"] if p["category"] == "main"]
+    assert not any(p["optional"] for p in main_packages)
+    assert all(p["optional"] for p in merged["package"] if p["category"] != "main")
+    for platform in merged["metadata"]["platforms"]:
+        # The main packages are those of every environment that has the platform
+        env_urls = [
+            {p["url"] for p in data["package"] if p["platform"] == platform}
+            for data in envs.values()
+            if platform in data["metadata"]["platforms"]
+        ]
+        assert {
+            p["url"] for p in main_packages if p["platform"] == platform
+        } == set.intersection(*env_urls)
+    # conda-lock keeps a single entry per package and platform
+    keys = [(p["platform"], p["manager"], p["name"]) for p in merged["package"]]
+    assert len(keys) == len(set(keys))
+    assert "default+project1" in {p["category"] for p in merged["package"]}
+    for env_name, data in envs.items():
+        # An environment is restored by installing main and the categories with it
+        installed = [
+            {k: v for k, v in p.items() if k not in ("category", "optional")}
+            for p in merged["package"]
+            if (p["category"] == "main" or env_name in p["category"].split("+"))
+            and p["platform"] in data["metadata"]["platforms"]
+        ]
+        expected = [
+            {k: v for k, v in p.items() if k not in ("category", "optional")}
+            for p in data["package"]
+        ]
+        assert sorted(installed, key=str) == sorted(expected, key=str)
+
+    with patch("sys.argv", [*argv, "--merge", "--check"]):
+        assert main() == 0
+    with patch("sys.argv", [*argv, "--merge", "--check", "-e", "project1"]):
+        assert main() == 1
+    with patch("sys.argv", [*argv, "--merge", "--no-cache", "--jobs", "2"]):
+        assert main() == 0
+    with (tmp_path / "conda-lock.yml").open() as f:
+        assert yaml.safe_load(f) == merged
+    with (
+        patch("sys.argv", [*argv, "--merge", "--explicit"]),
+        pytest.raises(SystemExit),
+    ):
+        main()
+
+
+def test_main_merge_conflicting_versions(
+    tmp_path: Path,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """Test that merging fails when environments lock other versions of a package."""
+    old = "https://conda.anaconda.org/conda-forge/osx-64/bzip2-1.0.8-hfdf4475_7.conda"
+    new = old.replace("1.0.8", "1.0.9")
+    content = PIXI_LOCK_PATH.read_text()
+    environments, packages = content.split("\npackages:\n")
+    default, project1 = environments.split("  project1:\n")
+    block = packages[packages.index(f"- conda: {old}\n") :]
+    block = block[: block.index("\n- ", 1) + 1]
+    lock_path = tmp_path / "pixi.lock"
+    lock_path.write_text(
+        f"{default}  project1:\n{project1.replace(old, new)}\npackages:\n"
+        f"{packages}{block.replace(old, new).replace('7ed4301d', '0123abcd')}",
+    )
+    assert _get_environment(LockFile.from_path(lock_path), "project1")
+
+    argv = ["pixi-to-conda-lock", str(lock_path), "-o", str(tmp_path), "--merge"]
+    with patch("sys.argv", argv):
+        assert main() == 1
+    assert "Cannot merge the environments on osx-64" in caplog.text
+    assert f"{old} in default" in caplog.text
+    assert f"{new} in project1" in caplog.text
+    assert not list(tmp_path.glob("*.yml"))
+    # Without --merge, every environment keeps its own version
+    with patch("sys.argv", argv[:-1]):
+        assert main() == 0
+
+
+def test_merge_renders_with_conda_lock(tmp_path: Path) -> None:
+    """Test that conda-lock renders every environment from the merged file."""
+    conda_lock = pytest.importorskip("conda_lock.conda_lock")
+    from conda_lock.lockfile import parse_conda_lock_file
+
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PATH), "-o", str(tmp_path), "--merge"]
+    with patch("sys.argv", argv):
+        assert main() == 0
+    merged_path = tmp_path / "conda-lock.yml"
+    with merged_path.open() as f:
+        categories = {p["category"] for p in yaml.safe_load(f)["package"]}
+    for env_name in ("default", "project1", "project2"):
+        data = convert_to_dict(PIXI_LOCK_PATH, env_name)
+        extras = {c for c in categories if env_name in c.split("+")}
+        for platform in data["metadata"]["platforms"]:
+            lines = conda_lock.render_lockfile_for_platform(
+                lockfile=parse_conda_lock_file(merged_path),
+                include_dev_dependencies=False,
+                extras=extras,
+                kind="explicit",
+                platform=platform,
+            )
+            assert sorted(line for line in lines if "://" in line) == sorted(
+                f"{p['url']}#{p['hash']['md5']}"
+                for p in data["package"]
+                if p["platform"] == platform and not p["name"].startswith("__")
+            )
+
+
+def test_mirror_map() -> None:
+    """Test that URLs are rewritten with the longest matching prefix."""
+    mirrors = _mirror_map(
+        [
+            "https://conda.anaconda.org/=https://mirror/conda/",
+            "https://conda.anaconda.org/bioconda/=https://bio-mirror/",
+            "https://files.pythonhosted.org/=https://mirror/pypi/?a=b/",
+        ],
+    )
+    assert mirrors is not None
+    assert (
+        mirrors.rewrite("https://conda.anaconda.org/conda-forge/noarch/a.conda")
+        == "https://mirror/conda/conda-forge/noarch/a.conda"
+    )
+    assert (
+        mirrors.rewrite("https://conda.anaconda.org/bioconda/noarch/b.conda")
+        == "https://bio-mirror/noarch/b.conda"
+    )
+    assert (
+        mirrors.rewrite("https://files.pythonhosted.org/c.whl")
+        == "https://mirror/pypi/?a=b/c.whl"
+    )
+    assert mirrors.rewrite("https://example.com/d.whl") == "https://example.com/d.whl"
+    assert _mirror_map([]) is None
+    with pytest.raises(ValueError, match="PREFIX=MIRROR"):
+        _mirror_map(["https://conda.anaconda.org/"])
+
+
+def test_convert_with_mirrors(tmp_path: Path) -> None:
+    """Test that mirrors rewrite the package URLs, channels and content hashes."""
+    mirrors = {
+        "https://conda.anaconda.org/": "https://mirror.example.com/conda/",
+        "https://files.pythonhosted.org/packages/": "https://mirror.example.com/pypi/",
+    }
+    original = convert_to_dict(PIXI_LOCK_PYPI_PATH, "default")
+    mirrored = convert_to_dict(PIXI_LOCK_PYPI_PATH, "default", mirrors=mirrors)
+    assert mirrored["metadata"]["channels"] == [
+        {"url": "https://mirror.example.com/conda/conda-forge/", "used_env_vars": []},
+    ]
+    assert {p["manager"] for p in mirrored["package"]} == {"conda", "pip"}
+    for before, after in zip(original["package"], mirrored["package"]):
+        prefix = next(prefix for prefix in mirrors if before["url"].startswith(prefix))
+        assert after["url"] == mirrors[prefix] + before["url"][len(prefix) :]
+        assert {**after, "url": before["url"]} == before
+    assert mirrored["metadata"]["content_hash"] != original["metadata"]["content_hash"]
+    assert [p["url"] for p in mirrored["package"]] == [
+        p["url"]
+        for p in iter_conda_lock_packages(
+            PIXI_LOCK_PYPI_PATH,
+            "default",
+            mirrors=mirrors,
+        )
+    ]
+
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PYPI_PATH), "-o", str(tmp_path)]
+    argv += ["-e", "default", "--jobs", "2"]
+    mirror_args = [f"--mirror={prefix}={mirror}" for prefix, mirror in mirrors.items()]
+    with patch("sys.argv", [*argv, *mirror_args]):
+        assert main() == 0
+    with (tmp_path / "conda-lock.yml").open() as f:
+        assert yaml.safe_load(f) == mirrored
+    with patch("sys.argv", [*argv, *mirror_args, "--check"]):
+        assert main() == 0
+    with patch("sys.argv", [*argv, "--check"]):
+        assert main() == 1
+
+
+def test_reachable_packages_follows_unconditional_requirements() -> None:
+    """Test that --only follows a dependency that is not only for an extra."""
+    packages = [
+        SimpleNamespace(name="pip", requires_dist=[]),
+        SimpleNamespace(
+            name="celery",
+            requires_dist=[
+                'vine ; extra == "x"',
+                "vine>=5",
+                "kombu<5.6,>=5.5.2",
+                'kombu[sqs]>=5.5.0 ; extra == "sqs"',
+                'boto3>=1.26 ; extra == "sqs"',
+            ],
+        ),
+        SimpleNamespace(name="kombu", requires_dist=None),
+        SimpleNamespace(name="vine", requires_dist=[]),
+        SimpleNamespace(name="boto3", requires_dist=[]),
+    ]
+    reachable, missing = _reachable_packages(
+        cast("list[LockedPackage]", packages),
+        ["celery"],
+    )
+    assert [package.name for package in reachable] == ["pip", "celery", "kombu", "vine"]
+    assert missing == []
+
+
+def test_convert_only(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test that --only keeps the transitive dependencies of the packages."""
+    full = convert_to_dict(PIXI_LOCK_PYPI_PATH, "default")
+    pruned = convert_to_dict(
+        PIXI_LOCK_PYPI_PATH,
+        "default",
+        only=["readline", "Python_ABI"],
+    )
+    assert [(p["platform"], p["name"]) for p in pruned["package"]] == [
+        (platform, name)
+        for platform in ("osx-64", "osx-arm64")
+        for name in ("ncurses", "python_abi", "readline")
+    ]
+    assert pruned["metadata"]["platforms"] == full["metadata"]["platforms"]
+    assert pruned["metadata"]["content_hash"] != full["metadata"]["content_hash"]
+
+    # PyPI packages need pip (and so python) to be installed
+    pypi = convert_to_dict(PIXI_LOCK_PYPI_PATH, "default", only=["numthreads"])
+    names = {(p["platform"], p["name"]) for p in pypi["package"]}
+    assert {("osx-64", "numthreads"), ("osx-64", "pip"), ("osx-64", "python")} <= names
+    for entry in pypi["package"]:
+        for name in entry["dependencies"]:
+            assert (
+                not any(
+                    (p["platform"], p["name"]) == (entry["platform"], name)
+                    for p in full["package"]
+                )
+                or (entry["platform"], name) in names
+            )
+    assert [
+        p["name"]
+        for p in iter_conda_lock_packages(
+            PIXI_LOCK_PYPI_PATH,
+            platforms=["osx-64"],
+            only=["readline"],
+        )
+    ] == ["ncurses", "readline"]
+
+    with caplog.at_level("WARNING"):
+        assert convert_to_dict(PIXI_LOCK_PATH, only=["nope"])["package"] == []
+    assert "Package(s) nope not found in environment 'default'" in caplog.text
+
+    argv = ["pixi-to-conda-lock", str(PIXI_LOCK_PYPI_PATH), "-o", str(tmp_path)]
+    argv += ["-e", "default", "--only", "readline", "python_abi"]
+    for jobs in ("1", "2"):
+        with patch("sys.argv", [*argv, "--jobs", jobs, "--no-cache"]):
+            assert main() == 0
+        with (tmp_path / "conda-lock.yml").open() as f:
+            assert yaml.safe_load(f) == pruned
+    with patch("sys.argv", [*argv, "--check"]):
+        assert main() == 0
+    with patch("sys.argv", [*argv[:-1], "--check"]):
+        assert main() == 1
+
+
+def test_convert_skips_unchanged_environment(tmp_path: Path) -> None:
+    """Test that convert skips an environment that did not change."""
+    output = tmp_path / "conda-lock.yml"
+    convert(PIXI_LOCK_PATH, conda_lock_path=output)
+    with patch(
+        "pixi_to_conda_lock._iter_platform_entries",
+        side_effect=_iter_platform_entries,
+    ) as mock_convert:
+        convert(PIXI_LOCK_PATH, conda_lock_path=output)
+        mock_convert.assert_not_called()
+        # A different environment does not match the cached fingerprint
+        convert(PIXI_LOCK_PATH, environment="project2", conda_lock_path=output)
+        mock_convert.assert_called_once()
+        convert(PIXI_LOCK_PATH, conda_lock_path=output, use_cache=False)
+        assert mock_convert.call_count == 2  # noqa: PLR2004
+
+
+def test_watch_reconverts_changed_environments(tmp_path: Path) -> None:
+    """Test that --watch converts a burst of lock file changes once, incrementally."""
+    lock_path = tmp_path / "pixi.lock"
+    lock_path.write_bytes(PIXI_LOCK_PATH.read_bytes())
+    args = argparse.Namespace(
+        pixi_lock=lock_path,
+        environment=None,
+        platform=None,
+        artifact_cache=None,
+        explicit=False,
+        split_platforms=False,
+        mirror=None,
+        only=None,
+        merge=False,
+        jobs=1,
+        no_cache=True,
+    )
+    clock = [0.0]
+    edits = {  # a burst of edits: touch the file, then change environments
+        1.0: lambda: lock_path.write_bytes(PIXI_LOCK_PATH.read_bytes() + b"\n"),
+        1.1: lambda: lock_path.write_bytes(PIXI_LOCK_PYPI_PATH.read_bytes()),
+    }
+
+    def sleep(seconds: float) -> None:
+        clock[0] += seconds
+        for at in sorted(edits):
+            if at <= clock[0]:
+                edits.pop(at)()
+
+    fake_time = SimpleNamespace(monotonic=lambda: clock[0], sleep=sleep)
+    with (
+        patch("pixi_to_conda_lock.time", fake_time),
+        patch(
+            "pixi_to_conda_lock._iter_platform_entries",
+            side_effect=_iter_platform_entries,
+        ) as mock_convert,
+    ):
+        _watch(args, tmp_path, None, interval=0.1, debounce=0.5, max_conversions=2)
+    converted = [call.args[2] for call in mock_convert.call_args_list]
+    assert sorted(converted[:3]) == ["default", "project1", "project2"]
+    # One conversion for the burst, "project2" is the same in both lock files
+    assert sorted(converted[3:]) == ["default", "project1"]
+    assert not edits
+    with (tmp_path / "conda-lock.yml").open() as f:
+        conda_lock_data = yaml.safe_load(f)
+    assert any(p["manager"] == "pip" for p in conda_lock_data["package"])
+
+
+def test_watch_does_not_reuse_entries_of_changed_packages(tmp_path: Path) -> None:
+    """Test that --watch writes the new hashes of a package that changed."""
+    lock_path = tmp_path / "pixi.lock"
+    lock_path.write_bytes(PIXI_LOCK_PATH.read_bytes())
+    args = argparse.Namespace(
+        pixi_lock=lock_path,
+        environment=None,
+        platform=None,
+        artifact_cache=None,
+        explicit=False,
+        split_platforms=False,
+        mirror=None,
+        only=None,
+        merge=False,
+        jobs=1,
+        no_cache=True,
+    )
+    old_md5, new_md5 = "7ed4301d437b59045be7e051a0308211", "0123456789abcdef" * 2
+    clock = [0.0]
+
+    def sleep(seconds: float) -> None:
+        clock[0] += seconds
+        if clock[0] >= 1.0 and old_md5 in lock_path.read_text():
+            lock_path.write_text(lock_path.read_text().replace(old_md5, new_md5))
+
+    fake_time = SimpleNamespace(monotonic=lambda: clock[0], sleep=sleep)
+    with patch("pixi_to_conda_lock.time", fake_time):
+        _watch(args, tmp_path, None, interval=0.1, debounce=0.5, max_conversions=2)
+    with (tmp_path / "conda-lock.yml").open() as f:
+        conda_lock_data = yaml.safe_load(f)
+    (bzip2,) = [
+        p
+        for p in conda_lock_data["package"]
+        if p["name"] == "bzip2" and p["platform"] == "osx-64"
+    ]
+    assert bzip2["hash"]["md5"] == new_md5
+    assert conda_lock_data == convert_to_dict(lock_path)
+
+
+@pytest.mark.parametrize(
+    "source",
+    ["lock_file", "bytes", "path"],
+)
+def test_in_memory_api(source: str) -> None:
+    """Test that the in-memory API matches convert and accepts all lock inputs."""
+    lock_file = {
+        "lock_file": LockFile.from_path(PIXI_LOCK_PYPI_PATH),
+        "bytes": PIXI_LOCK_PYPI_PATH.read_bytes(),
+        "path": PIXI_LOCK_PYPI_PATH,
+    }[source]
+    conda_lock_data = convert_to_dict(lock_file)
+    assert conda_lock_data == _convert_env_to_conda_lock(
+        LockFile.from_path(PIXI_LOCK_PYPI_PATH),
+        "default",
+    )
+    assert all(type(entry) is dict for entry in conda_lock_data["package"])
+    packages = iter_conda_lock_packages(lock_file)
+    assert next(packages) == conda_lock_data["package"][0]
+    assert [next(packages), *packages] == conda_lock_data["package"][1:]
+
+    # The entries are not kept once they are yielded
+    indexes: list[_PackageIndex] = []
+
+    def planned_index(*args: Any) -> _PackageIndex:
+        indexes.append(_planned_index(*args))
+        return indexes[-1]
+
+    with patch("pixi_to_conda_lock._planned_index", side_effect=planned_index):
+        assert list(iter_conda_lock_packages(lock_file)) == conda_lock_data["package"]
+    (index,) = indexes
+    assert index.entries == {}
+    assert index.records == {}
+
+
+def test_iter_conda_lock_packages_platforms(lock_file: LockFile) -> None:
+    """Test that iter_conda_lock_packages only yields the requested platforms."""
+    packages = list(iter_conda_lock_packages(lock_file, platforms=["osx-64"]))
+    assert len(packages) == 2  # noqa: PLR2004
+    assert {entry["platform"] for entry in packages} == {"osx-64"}
+    with pytest.raises(ValueError, match="win-64 not found"):
+        list(iter_conda_lock_packages(lock_file, platforms=[Platform("win-64")]))
+
+
+def test_apply_artifact_hashes(
+    lock_file_pypi: LockFile,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test filling in and verifying hashes with a local artifact directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    entries = [  # noarch packages are also on the other platforms
+        entry
+        for entry in _convert_env_to_conda_lock(lock_file_pypi, "default")["package"]
+        if entry.platform == "osx-64"
+    ]
+    conda_index = next(i for i, e in enumerate(entries) if e.manager == "conda")
+    pip_index = next(i for i, e in enumerate(entries) if e.manager == "pip")
+    conda_entry = entries[conda_index]
+    pip_entry = entries[pip_index]
+    pip_sha256 = pip_entry.sha256
+    conda_content = b"conda archive"
+    conda_entry.md5 = hashlib.md5(conda_content).hexdigest()  # noqa: S324
+    conda_entry.sha256 = None  # e.g., missing in the repodata
+    artifact_dir = tmp_path / "pkgs"
+    artifact_dir.mkdir()
+    (artifact_dir / conda_entry.url.rsplit("/", 1)[-1]).write_bytes(conda_content)
+    (artifact_dir / pip_entry.url.rsplit("/", 1)[-1]).write_bytes(b"tampered")
+
+    artifacts = _ArtifactHashes(artifact_dir)
+    shared = list(entries)
+    assert _apply_artifact_hashes(entries, artifacts) == 1  # the pip entry
+    assert artifacts.n_mismatches == 1
+    assert entries[conda_index].sha256 == hashlib.sha256(conda_content).hexdigest()
+    assert entries[pip_index].sha256 == pip_sha256  # mismatches are not overwritten
+    # The entries (shared with the package index) are replaced, not modified
+    assert entries[conda_index] is not conda_entry
+    assert conda_entry.sha256 is None
+    with pytest.raises(ValueError, match="1 package hash"):
+        artifacts.check()
+
+    # The hashes are cached by file name, size and mtime, outside the directory
+    artifacts.save()
+    assert len(list(artifact_dir.iterdir())) == 2  # noqa: PLR2004
+    assert artifacts.cache_path.is_relative_to(tmp_path / "cache")
+    with patch("pixi_to_conda_lock._hash_artifact") as mock_hash:
+        assert _apply_artifact_hashes(shared, _ArtifactHashes(artifact_dir)) == 1
+    mock_hash.assert_not_called()
+
+
+def test_convert_artifact_cache(
+    tmp_path: Path,
+    caplog: pytest.LogCaptureFixture,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that convert fails on archives that do not match the lock file."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    lock_file = LockFile.from_path(PIXI_LOCK_PYPI_PATH)
+    entries = _convert_env_to_conda_lock(lock_file, "default")["package"]
+    artifact_dir = tmp_path / "wheelhouse"
+    artifact_dir.mkdir()
+    pip_entry = next(e for e in entries if e.manager == "pip")
+    (artifact_dir / pip_entry.url.rsplit("/", 1)[-1]).write_bytes(b"tampered")
+    output = tmp_path / "conda-lock.yml"
+    for _ in range(2):  # mismatching outputs are not cached
+        with pytest.raises(ValueError, match="do not match the archives"):
+            convert(
+                PIXI_LOCK_PYPI_PATH,
+                conda_lock_path=output,
+                artifact_cache=artifact_dir,
+            )
+    assert f"Hash mismatch for {pip_entry.url}" in caplog.text
+    with output.open() as f:
+        packages = yaml.safe_load(f)["package"]
+    assert packages == entries
+
+    # and the command line exits with an error
+    with patch.object(
+        sys,
+        "argv",
+        [
+            "pixi-to-conda-lock",
+            str(PIXI_LOCK_PYPI_PATH),
+            "--output",
+            str(tmp_path / "cli"),
+            "--artifact-cache",
+            str(artifact_dir),
+        ],
+    ):
+        assert main() == 1
+        assert main() == 1
+
+
+def test_planned_index_releases_entries(lock_file: LockFile) -> None:
+    """Test that a planned index only keeps the entries that are reused."""
+    envs = [env for _, env in lock_file.environments()]
+    index = _planned_index(envs, None)
+    by_key: dict[tuple[str, str], list[_PackageEntry]] = {}
+    for env in envs:
+        for entries in _iter_platform_entries(
+            env,
+            _sorted_platforms(env),
+            index=index,
+        ):
+            for entry in entries:
+                by_key.setdefault((entry.url, entry.platform), []).append(entry)
+            assert not index.records  # released once the entries are created
+    assert any(len(entries) > 1 for entries in by_key.values())
+    assert all(entry is entries[0] for entries in by_key.values() for entry in entries)
+    assert index.entries == {}
+    assert index.uses == {}
+
+    # Without a plan, all entries are kept for later conversions
+    index = _PackageIndex()
+    for env in envs:
+        list(_iter_platform_entries(env, _sorted_platforms(env), index=index))
+    assert len(index.entries) == len(by_key)
+
+
+def test_parallel_conversion_shares_entries_with_index() -> None:
+    """Test that entries from workers are deduplicated with the keys of the index."""
+    lock_file = LockFile.from_path(PIXI_LOCK_PYPI_PATH)
+    mirrors = {"https://": "https://mirror.example.com/"}
+    index = _PackageIndex(_mirror_map(mirrors))
+    serial = _convert_env_to_conda_lock(lock_file, "default", index=index)
+    ((env_name, platform_entries),) = _convert_envs_in_parallel(
+        PIXI_LOCK_PYPI_PATH,
+        lock_file,
+        ["default"],
+        2,
+        index=index,
+    )
+    assert env_name == "default"
+    entries = [entry for entries in platform_entries for entry in entries]
+    assert {entry.manager for entry in entries} == {"conda", "pip"}
+    # The (mirrored, and for PyPI defragmented) URLs differ from the index keys
+    assert [id(entry) for entry in entries] == [id(e) for e in serial["package"]]
+
+
+def test_package_index_shares_entries_across_environments(
+    lock_file: LockFile,
+) -> None:
+    """Test that environments reuse the repodata records and entries of others."""
+    expected = {
+        env_name: _convert_env_to_conda_lock(lock_file, env_name)
+        for env_name in ("default", "project1")
+    }
+    index = _PackageIndex()
+    default = _convert_env_to_conda_lock(lock_file, "default", index=index)
+    with patch(
+        "rattler.Environment.conda_repodata_records_for_platform",
+    ) as mock_records:
+        project1 = _convert_env_to_conda_lock(lock_file, "project1", index=index)
+    mock_records.assert_not_called()  # all packages are in "default" too
+    assert default == expected["default"]
+    assert project1 == expected["project1"]
+    default_ids = {id(entry) for entry in default["package"]}
+    assert all(id(entry) in default_ids for entry in project1["package"])
+
+
+def test_list_of_str_dependencies_to_dict_is_shared_and_read_only() -> None:
+    """Test that parsed dependencies are memoized, shared and read-only."""
+    result = _list_of_str_dependencies_to_dict(["python >=3.9", "numpy"])
+    assert result is _list_of_str_dependencies_to_dict(["python >=3.9", "numpy"])
+    assert result == {"python": ">=3.9", "numpy": "*"}
+    with pytest.raises(TypeError, match="read-only"):
+        result["numpy"] = ">=2"  # type: ignore[index]
+    with pytest.raises(TypeError, match="read-only"):
+        result.update({"numpy": ">=2"})
+    assert result == {"python": ">=3.9", "numpy": "*"}
+
+    # Survives pickling (parallel conversion) as the same shared object
+    assert pickle.loads(pickle.dumps(result)) is result  # noqa: S301
+    # And can still be dumped with PyYAML
+    assert yaml.safe_load(yaml.safe_dump(result)) == result
+    assert yaml.safe_load(yaml.dump(result)) == result
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_main_profile(tmp_path: Path, jobs: str) -> None:
+    """Test that --profile writes per-stage timings, package counts and memory."""
+    profile_path = tmp_path / "profile.json"
+    with patch(
+        "sys.argv",
+        [
+            "pixi-to-conda-lock",
+            str(PIXI_LOCK_PYPI_PATH),
+            "-o",
+            str(tmp_path),
+            "--profile",
+            str(profile_path),
+            "--jobs",
+            jobs,
+        ],
+    ):
+        assert main() == 0
+    with open(profile_path) as f:
+        profile = json.load(f)
+    records = profile["stages"]
+    assert profile["total_seconds"] == pytest.approx(sum(r["seconds"] for r in records))
+    assert [r["stage"] for r in records if r["environment"] is None] == ["parse"]
+    entries = {
+        (r["environment"], r["platform"]): r["packages"]
+        for r in records
+        if r["stage"] == "entries"
+    }
+    assert len(entries) == 5  # noqa: PLR2004
+    assert entries["default", "osx-64"] == 17  # noqa: PLR2004
+    writes = {
+        (r["environment"], r["platform"]): r["packages"]
+        for r in records
+        if r["stage"] == "write"
+    }
+    assert writes.keys() == entries.keys()  # written platform by platform
+    n_written = sum(n for (env, _), n in writes.items() if env == "default")
+    assert n_written == 34  # noqa: PLR2004
+    assert all(r["peak_memory_bytes"] >= 0 for r in records)
+    assert {r["stage"] for r in records} == {"parse", "repodata", "entries", "write"}
+
+
+def test_convert_profiler(tmp_path: Path) -> None:
+    """Test passing a Profiler to convert."""
+    profiler = Profiler(trace_memory=False)
+    convert(
+        PIXI_LOCK_PATH,
+        conda_lock_path=tmp_path / "conda-lock.yml",
+        profiler=profiler,
+    )
+    assert [r["stage"] for r in profiler.records] == [
+        "parse",
+        "repodata",
+        "entries",
+        "write",
+        "repodata",
+        "entries",
+        "write",
+    ]
+    assert all(r["peak_memory_bytes"] is None for r in profiler.records)
+    n_entries = sum(r["packages"] for r in profiler.records if r["stage"] == "entries")
+    assert n_entries == 5  # noqa: PLR2004
+
+
+def test_result_cache_evicts_least_recently_used() -> None:
+    """Test that the result cache is an LRU cache bounded by the result sizes."""
+    cache = _ResultCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"  # now "b" is the least recently used
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    cache.put("big", b"x" * 11)  # larger than the cache, not cached
+    assert cache.get("big") is None
+    assert cache.stats() == {
+        "hits": 2,
+        "misses": 2,
+        "evictions": 1,
+        "entries": 2,
+        "bytes": 8,
+        "max_bytes": 10,
+    }
+
+
+def test_serve() -> None:
+    """Test converting lock files over HTTP, with cached results and stats."""
+    server = _make_server("127.0.0.1", 0, _ResultCache(1 << 20))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = "http://{}:{}".format(*server.server_address[:2])
+
+    def request(path: str, body: bytes | None = None) -> tuple[int, bytes]:
+        try:
+            url = base_url + path
+            with urllib.request.urlopen(url, data=body) as response:  # noqa: S310
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    try:
+        body = PIXI_LOCK_PYPI_PATH.read_bytes()
+        expected = convert_to_dict(body, "project1", platforms=["osx-64"])
+        for _ in range(2):
+            status, result = request(
+                "/convert?environment=project1&platform=osx-64",
+                body,
+            )
+            assert status == 200  # noqa: PLR2004
+            assert yaml.safe_load(result) == expected
+        status, result = request("/convert?environment=missing", body)
+        assert status == 400  # noqa: PLR2004
+        assert b"not found" in result
+        assert request("/convert", b"not: [a lock file")[0] == 400  # noqa: PLR2004
+        assert request("/unknown")[0] == 404  # noqa: PLR2004
+        connection = http.client.HTTPConnection(*server.server_address[:2])
+        connection.putrequest("POST", "/convert")
+        connection.putheader("Content-Length", "invalid")
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 400  # noqa: PLR2004
+        assert b"Invalid Content-Length" in response.read()
+        connection.close()
+        status, result = request("/stats")
+        assert status == 200  # noqa: PLR2004
+        stats = json.loads(result)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert stats["cache"]["hits"] == 1
+    assert stats["cache"]["misses"] == 3  # noqa: PLR2004
+    assert stats["cache"]["entries"] == 1
+    assert stats["convert"]["requests"] == 5  # noqa: PLR2004
+    assert stats["convert"]["errors"] == 3  # noqa: PLR2004
+    assert stats["convert"]["max_seconds"] >= stats["convert"]["mean_seconds"] > 0
+
+
+def test_main_serve() -> None:
+    """Test that `serve` starts a server and stops it on Ctrl+C."""
+    with (
+        patch("sys.argv", ["pixi-to-conda-lock", "serve", "--port", "0"]),
+        patch(
+            "http.server.ThreadingHTTPServer.serve_forever",
+            side_effect=KeyboardInterrupt,
+        ) as mock_serve,
+    ):
+        assert main() == 0
+    mock_serve.assert_called_once()
+
+
+HEAVY_MODULES = (
+    "concurrent.futures",
+    "importlib.metadata",
+    "rattler",
+    "rich",
+    "tracemalloc",
+    "yaml",
+)
+
+
+def _run_and_list_heavy_imports(argv: list[str] | None) -> tuple[int | None, list[str]]:
+    """Import the module (and run main with argv) in a fresh interpreter."""
+    script = f"""
+import json, sys
+import pixi_to_conda_lock
+exit_code = None
+if {argv!r} is not None:
+    sys.argv = ["pixi-to-conda-lock", *{argv!r}]
+    try:
+        exit_code = pixi_to_conda_lock.main()
+    except SystemExit as e:
+        exit_code = e.code
+heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps([exit_code, heavy]))
+"""
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=TEST_DIR.parent,
+    )
+    exit_code, heavy = json.loads(result.stdout.splitlines()[-1])
+    return exit_code, heavy
+
+
+def test_import_time_no_heavy_imports(tmp_path: Path) -> None:
+    """Test that heavy dependencies are only imported when converting."""
+    assert _run_and_list_heavy_imports(None) == (None, [])
+    assert _run_and_list_heavy_imports(["--help"]) == (0, [])
+    missing = str(tmp_path / "nonexistent.lock")
+    assert _run_and_list_heavy_imports([missing]) == (1, [])
+
+    # A run on an unchanged lock file (with up to date outputs) is a no-op
+    argv = [str(PIXI_LOCK_PATH), "-o", str(tmp_path)]
+    exit_code, heavy = _run_and_list_heavy_imports(argv)
+    assert exit_code == 0
+    assert "rattler" in heavy
+    assert _run_and_list_heavy_imports(argv) == (0, [])
+    assert _run_and_list_heavy_imports([*argv, "-e", "project1"]) == (0, [])
@@ -0,0 +1,178 @@
+"""Offline performance regression tests on synthetic pixi.lock files.
+
+The budgets are generous (about 10x the timings on a laptop) so that they only
+catch real regressions. The scaling run up to 100k entries is slow, and the
+wall-clock races against other implementations are noisy on loaded machines (and
+under coverage tracing), so they only run when ``PIXI_TO_CONDA_LOCK_BENCHMARK=1``
+is set.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import re
+import time
+from typing import TYPE_CHECKING
+from unittest.mock import patch
+
+import pytest
+import yaml
+from rattler import LockFile
+
+from pixi_to_conda_lock import (
+    _convert_env_to_conda_lock,
+    _dump_conda_lock,
+    _parse_requirements,
+    main,
+)
+from tests.benchmark import benchmark_synthetic
+from tests.synthetic_lock import n_entries, write_pixi_lock
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+# Maximum microseconds per package entry for each stage
+STAGE_BUDGETS_US = {
+    "parse": 200,
+    "repodata": 100,
+    "entries": 300,
+    "write": 300,
+    "total": 800,
+}
+RUN_SCALING = os.environ.get("PIXI_TO_CONDA_LOCK_BENCHMARK") == "1"
+
+
+@pytest.mark.parametrize("lock_version", [6, 7])
+def test_synthetic_lock_file(tmp_path: Path, lock_version: int) -> None:
+    """Test that synthetic lock files parse and convert to the expected entries."""
+    options = {
+        "n_environments": 3,
+        "platforms": ("linux-64", "osx-arm64", "win-64"),
+        "n_conda_packages": 30,
+        "n_pypi_packages": 5,
+    }
+    lock_path = write_pixi_lock(
+        tmp_path / "pixi.lock",
+        lock_version=lock_version,
+        **options,
+    )
+    lock_file = LockFile.from_path(lock_path)
+    env_names = sorted(name for name, _ in lock_file.environments())
+    assert env_names == ["default", "env-1", "env-2"]
+    total = 0
+    for env_name in env_names:
+        conda_lock_data = _convert_env_to_conda_lock(lock_file, env_name)
+        managers = {entry["manager"] for entry in conda_lock_data["package"]}
+        assert managers == {"conda", "pip"}
+        total += len(conda_lock_data["package"])
+    assert total == n_entries(**options)
+
+
+@pytest.mark.parametrize("lock_version", [6, 7])
+def test_stage_budgets(tmp_path: Path, lock_version: int) -> None:
+    """Test that no stage of the conversion exceeds its time budget per entry."""
+    result = benchmark_synthetic(2_000, tmp_path, lock_version=lock_version)
+    for stage, budget in STAGE_BUDGETS_US.items():
+        assert result["us_per_entry"][stage] < budget, (stage, result)
+
+
+@pytest.mark.skipif(not RUN_SCALING, reason="set PIXI_TO_CONDA_LOCK_BENCHMARK=1")
+def test_yaml_writer_faster_than_pyyaml(tmp_path: Path) -> None:
+    """Test that the conda-lock emitter beats PyYAML (with libyaml if available)."""
+    lock_path = write_pixi_lock(tmp_path / "pixi.lock", n_conda_packages=400)
+    conda_lock_data = _convert_env_to_conda_lock(
+        LockFile.from_path(lock_path),
+        "default",
+    )
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+    def best_of(func: Callable[[], object], repeat: int = 3) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    ours = best_of(lambda: _dump_conda_lock(conda_lock_data, io.StringIO().write))
+    pyyaml = best_of(
+        lambda: yaml.dump(conda_lock_data, Dumper=dumper, sort_keys=False),
+    )
+    assert ours < pyyaml
+
+
+@pytest.mark.skipif(not RUN_SCALING, reason="set PIXI_TO_CONDA_LOCK_BENCHMARK=1")
+def test_requirement_parser_faster_than_re_match() -> None:
+    """Test that parsing requirement lists beats matching every string on its own."""
+    per_string = re.compile(r"([^<>=!~]+)(.+)?")  # the parser it replaced
+
+    def parse_per_string(requirements: list[str]) -> dict[str, str]:
+        dependencies = {}
+        for requirement in requirements:
+            match = per_string.match(requirement)
+            if match:
+                dependencies[match.group(1).strip()] = (match.group(2) or "*").strip()
+        return dependencies
+
+    lists = [
+        [
+            f"dep-{i}-{j} >={j}.{i},<{j + 1}.0a0",
+            f"build-{i}-{j} 1.{j}.* *_cp31{j}",
+            f"plain-{i}-{j}",
+            f"pypi-{i}-{j}>={j} ; extra == 'test'",
+        ]
+        * 3
+        for i in range(200)
+        for j in range(5)
+    ]
+
+    def best_of(func: Callable[[list[str]], object], repeat: int = 5) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for requirements in lists:
+                func(requirements)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    assert best_of(_parse_requirements) < best_of(parse_per_string)
+
+
+def test_merged_output_scales_with_unique_packages(tmp_path: Path) -> None:
+    """Test that merging environments writes the shared packages only once."""
+    platforms = ("linux-64", "osx-arm64")
+    lock_path = write_pixi_lock(
+        tmp_path / "pixi.lock",
+        n_environments=4,
+        platforms=platforms,
+        n_conda_packages=100,
+        n_pypi_packages=20,
+        shared_fraction=0.9,
+    )
+    argv = ["pixi-to-conda-lock", str(lock_path), "--no-cache"]
+    with patch("sys.argv", [*argv, "-o", str(tmp_path / "separate")]):
+        assert main() == 0
+    with patch("sys.argv", [*argv, "-o", str(tmp_path / "merged"), "--merge"]):
+        assert main() == 0
+    with (tmp_path / "merged" / "conda-lock.yml").open() as f:
+        merged = yaml.safe_load(f)
+    # The shared packages once, and the 10 conda and 2 PyPI extras per environment
+    assert len(merged["package"]) == len(platforms) * ((90 + 4 * 10) + (18 + 4 * 2))
+    separate_size = sum(
+        path.stat().st_size for path in (tmp_path / "separate").glob("*.yml")
+    )
+    assert (tmp_path / "merged" / "conda-lock.yml").stat().st_size < separate_size / 2
+
+
+@pytest.mark.skipif(not RUN_SCALING, reason="set PIXI_TO_CONDA_LOCK_BENCHMARK=1")
+def test_scaling(tmp_path: Path) -> None:
+    """Test that the conversion time scales (about) linearly up to 100k entries."""
+    sizes = [1_000, 10_000, 100_000]
+    results = [benchmark_synthetic(size, tmp_path) for size in sizes]
+    smallest = results[0]["us_per_entry"]
+    for result in results[1:]:
+        for stage, us in result["us_per_entry"].items():
+            assert us < max(3 * smallest[stage], 5), (stage, result)
+        assert result["us_per_entry"]["total"] < STAGE_BUDGETS_US["total"]